@@ -0,0 +1,82 @@
+"""
+Compare the inline-image decode path before and after the zero-copy rewrite.
+
+For a synthetic data-URI JPEG of each size, reports the time to decode it
+into a PIL image and the peak memory allocated on top of the request string,
+as a multiple of the encoded image size (roughly the number of full-size
+copies alive at once; base64 text counts as 4/3).
+
+    uv run python benchmarks/base64_decode.py [SIZE_MB ...]
+"""
+
+import base64
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from vision_service import _decode_base64_image, _open_image  # noqa: E402
+
+
+def legacy_decode(source: str) -> Image.Image:
+    """The previous path: split the URI, ``b64decode`` (via ``str.encode``)."""
+    if source.startswith("data:"):
+        _, b64_data = source.split(",", 1)
+    else:
+        b64_data = source
+    base64.b64decode(b64_data[:16])
+    return _open_image(base64.b64decode(b64_data))
+
+
+def zero_copy_decode(source: str) -> Image.Image:
+    return _open_image(_decode_base64_image(source))
+
+
+def make_data_uri(size_mb: float) -> tuple[str, int]:
+    """A noisy JPEG of roughly ``size_mb`` megabytes, as a data URI."""
+    side = int(1200 * size_mb**0.5)
+    pixels = np.random.default_rng(0).integers(0, 256, (side, side, 3), np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=95)
+    data = buffer.getvalue()
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode(), len(data)
+
+
+def measure(decode, source: str, num_bytes: int, repeat: int = 5) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(source)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    decode(source)
+    # PIL allocates pixel memory outside the Python allocator, so the peak
+    # only counts the encoded copies: URI slices, ASCII bytes, decoded bytes
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ms": round(min(timings) * 1000, 2),
+        "peak_mb": round(peak / 1e6, 2),
+        "peak_copies": round(peak / num_bytes, 2),
+    }
+
+
+def main() -> None:
+    sizes = [float(arg) for arg in sys.argv[1:]] or [1.0, 3.0, 8.0]
+    for size_mb in sizes:
+        uri, num_bytes = make_data_uri(size_mb)
+        print(f"{num_bytes / 1e6:.1f} MB JPEG")
+        for form, source in (("data URI", uri), ("bare", uri.partition(",")[2])):
+            for name, decode in (("legacy", legacy_decode), ("new", zero_copy_decode)):
+                result = measure(decode, source, num_bytes)
+                print(f"  {form:<8} {name:<6} {result}")
+
+
+if __name__ == "__main__":
+    main()
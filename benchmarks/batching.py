@@ -0,0 +1,111 @@
+"""
+Compare the local batch scheduler's ``serial`` and ``batch`` dispatch modes.
+
+Each mode is driven by ``--concurrency`` callers submitting queries back to
+back for ``--duration`` seconds. The report has per-query latency and
+throughput. ``LOCAL_BATCH_DISPATCH=auto`` stays ``serial`` until ``batch``
+wins here on the target GPU:
+
+    MOONDREAM_MODE=local uv run python benchmarks/batching.py > batching.json
+
+``--fake`` swaps Photon for the fake client. That only measures scheduling
+overhead, since fake calls do not share a GPU.
+
+    uv run python benchmarks/batching.py --fake --latency 0.05 --jitter 0.04
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any
+
+from fake_moondream import install
+from harness import SRC, metadata, summarize
+from image_server import jpeg_bytes
+
+sys.path.insert(0, str(SRC))
+
+
+async def drive(
+    scheduler: Any, image: Any, concurrency: int, duration: float
+) -> dict[str, object]:
+    latencies: list[float] = []
+    stop_at = time.monotonic() + duration
+
+    async def caller(index: int) -> None:
+        count = 0
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            await scheduler.submit(image, f"Question {index}-{count}?")
+            latencies.append(time.monotonic() - start)
+            count += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*(caller(index) for index in range(concurrency)))
+    elapsed = time.monotonic() - start
+    return {
+        "queries": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, object]:
+    from batch_scheduler import BatchScheduler
+    from config import settings
+    from vision_service import VisionService, load_image
+
+    service = VisionService()
+    if not service.local:
+        raise SystemExit("Set MOONDREAM_MODE=local (or pass --fake)")
+    image = service._encode_image(
+        load_image(base64.b64encode(jpeg_bytes(1280, 720)).decode())
+    )
+    run_one = service.scheduler._run_one
+    results = {}
+    for mode in ("serial", "batch"):
+        scheduler = BatchScheduler(
+            run_one,
+            max_batch_size=settings.LOCAL_BATCH_MAX_SIZE,
+            max_wait=settings.LOCAL_BATCH_MAX_WAIT_MS / 1000,
+            dispatch=mode,
+        )
+        results[mode] = await drive(scheduler, image, args.concurrency, args.duration)
+        results[mode]["batches"] = scheduler.stats()["batch_size_histogram"]
+        scheduler.close()
+    service.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--fake", action="store_true", help="use the fake client")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+    if args.fake:
+        install(latency=args.latency, jitter=args.jitter)
+        os.environ["MOONDREAM_MODE"] = "local"
+        os.environ["WARMUP_ENABLED"] = "false"
+    report = {
+        "benchmark": "batching",
+        **metadata(),
+        "client": "fake" if args.fake else "photon",
+        "concurrency": args.concurrency,
+    }
+    # The service logs its startup to stdout; keep that clean for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report["results"] = asyncio.run(run(args))
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
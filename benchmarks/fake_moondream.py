@@ -0,0 +1,97 @@
+"""
+Deterministic stand-in for the Moondream SDK client.
+
+``install()`` replaces ``moondream.vl`` so ``VisionService`` builds fake
+clients: every call sleeps for ``latency`` ± ``jitter`` seconds (from a seeded
+RNG, so runs are repeatable) and returns a canned answer. Streamed answers
+are split into words, ``chunk_delay`` seconds apart.
+"""
+
+import base64
+import io
+import random
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import moondream as md
+from moondream.types import Base64EncodedImage
+from PIL import Image
+
+ANSWER = "A quiet driveway with a parked car and no people in view."
+
+
+class FakeMoondreamClient:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        chunk_delay: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _wait(self) -> None:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, delay))
+
+    def _words(self, text: str) -> Iterator[str]:
+        for word in text.split(" "):
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield word + " "
+
+    def encode_image(self, image: Any) -> Any:
+        if not isinstance(image, Image.Image):
+            return image
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=85)
+        data = base64.b64encode(buffer.getvalue()).decode()
+        return Base64EncodedImage(image_url=f"data:image/jpeg;base64,{data}")
+
+    def query(
+        self,
+        image: Any = None,
+        question: str | None = None,
+        stream: bool = False,
+        settings: Any = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        self._wait()
+        return {"answer": self._words(ANSWER) if stream else ANSWER}
+
+    def caption(
+        self, image: Any, length: str = "normal", stream: bool = False, **kwargs: Any
+    ) -> dict[str, Any]:
+        self._wait()
+        return {"caption": self._words(ANSWER) if stream else ANSWER}
+
+    def detect(self, image: Any, object: str, **kwargs: Any) -> dict[str, Any]:
+        self._wait()
+        box = {"x_min": 0.1, "y_min": 0.2, "x_max": 0.4, "y_max": 0.6}
+        return {"objects": [box]}
+
+    def point(self, image: Any, object: str, **kwargs: Any) -> dict[str, Any]:
+        self._wait()
+        return {"points": [{"x": 0.25, "y": 0.4}]}
+
+    def segment(self, image: Any, object: str, **kwargs: Any) -> dict[str, Any]:
+        self._wait()
+        box = {"x_min": 0.1, "y_min": 0.2, "x_max": 0.4, "y_max": 0.6}
+        return {"path": "M 0.1 0.2 L 0.4 0.2 L 0.4 0.6 Z", "bbox": box}
+
+    def close(self) -> None:
+        pass
+
+
+def install(**options: Any) -> None:
+    """Make ``moondream.vl`` return a ``FakeMoondreamClient(**options)``."""
+    md.vl = lambda *args, **kwargs: FakeMoondreamClient(**options)
@@ -0,0 +1,51 @@
+"""Shared helpers for the benchmark scripts: summaries and run metadata."""
+
+import math
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float], scale: float = 1000.0) -> dict[str, float]:
+    """p50/p95/p99/max/mean of ``samples`` (seconds), in ms by default."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "p50": round(percentile(ordered, 50) * scale, 3),
+        "p95": round(percentile(ordered, 95) * scale, 3),
+        "p99": round(percentile(ordered, 99) * scale, 3),
+        "max": round(ordered[-1] * scale, 3),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3),
+    }
+
+
+def metadata() -> dict[str, str]:
+    """Commit, Python and host, so results from different runs can be compared."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
@@ -0,0 +1,56 @@
+"""Local HTTP server for benchmark images, served at ``/<width>x<height>.jpg``."""
+
+import io
+import re
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+
+@lru_cache(maxsize=16)
+def jpeg_bytes(width: int, height: int) -> bytes:
+    """A seeded, camera-like (gradient plus noise) JPEG of the given size."""
+    rng = np.random.default_rng(width * 31 + height)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 24, (height, width, 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        match = re.fullmatch(r"/(\d+)x(\d+)\.jpg", self.path)
+        if match is None:
+            self.send_error(404)
+            return
+        body = jpeg_bytes(int(match[1]), int(match[2]))
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@contextmanager
+def serve_images(port: int = 0) -> Iterator[str]:
+    """Serve images on localhost in a background thread; yield the base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,207 @@
+"""
+End-to-end load test against the API backed by the fake Moondream client.
+
+Starts ``serve_fake.py`` in a subprocess and a local image server, then
+drives ``/v1/chat/completions``, ``/api/chat`` and ``/api/generate`` at each
+concurrency level for a fixed duration. Reports latency percentiles (total
+and time to first byte), throughput, errors and server RSS as JSON:
+
+    uv run python benchmarks/load.py --concurrency 1 8 32 > after.json
+
+Every request carries a distinct prompt, so the response cache and request
+sharing do not hide inference cost; image loads are still shared.
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+import psutil
+from harness import metadata, summarize
+from image_server import jpeg_bytes, serve_images
+
+ENDPOINTS = ("/v1/chat/completions", "/api/chat", "/api/generate")
+_PROXY_VARIABLES = {"http_proxy", "https_proxy", "all_proxy"}
+# Shared by every level, so no prompt is ever answered from the cache
+_prompt_ids = itertools.count()
+
+
+def payload(endpoint: str, image: str, prompt: str, stream: bool) -> dict[str, Any]:
+    """Request body for ``endpoint``; ``image`` is a URL or raw base64."""
+    if endpoint == "/v1/chat/completions":
+        url = image if image.startswith("http") else f"data:image/jpeg;base64,{image}"
+        content = [
+            {"type": "text", "text": prompt},
+            {"type": "image_url", "image_url": {"url": url}},
+        ]
+        return {
+            "model": "moondream",
+            "stream": stream,
+            "messages": [{"role": "user", "content": content}],
+        }
+    if endpoint == "/api/chat":
+        message = {"role": "user", "content": prompt, "images": [image]}
+        return {"model": "moondream", "stream": stream, "messages": [message]}
+    return {"model": "moondream", "stream": stream, "prompt": prompt, "images": [image]}
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    image: str,
+    concurrency: int,
+    duration: float,
+    stream: bool,
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    first_bytes: list[float] = []
+    errors: dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            body = payload(
+                endpoint, image, f"Describe the scene #{next(_prompt_ids)}", stream
+            )
+            start = time.perf_counter()
+            first_byte = None
+            try:
+                async with client.stream("POST", endpoint, json=body) as response:
+                    async for _ in response.aiter_raw():
+                        first_byte = first_byte or time.perf_counter()
+                    status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            end = time.perf_counter()
+            if status != "200":
+                errors[status] = errors.get(status, 0) + 1
+                continue
+            latencies.append(end - start)
+            first_bytes.append((first_byte or end) - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "stream": stream,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "ttfb_ms": summarize(first_bytes),
+    }
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen) -> None:
+    for _ in range(300):
+        if server.poll() is not None:
+            raise RuntimeError("benchmark server exited during startup")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not become healthy")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS))
+    parser.add_argument("--image", choices=("url", "base64"), default="url")
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model s")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="per word")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.size.split("x"))
+
+    # Keep loopback image fetches away from any configured proxy
+    env = {k: v for k, v in os.environ.items() if k.lower() not in _PROXY_VARIABLES}
+    # Disable the per-client rate limit; admission still applies as configured
+    env["CLIENT_RATE_LIMIT"] = "0"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            str(Path(__file__).with_name("serve_fake.py")),
+            f"--port={args.port}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--chunk-delay={args.chunk_delay}",
+        ],
+        env=env,
+        stdout=sys.stderr,  # keep stdout for the JSON report
+    )
+    results = []
+    try:
+        with serve_images() as base_url:
+            if args.image == "url":
+                image = f"{base_url}/{width}x{height}.jpg"
+            else:
+                image = base64.b64encode(jpeg_bytes(width, height)).decode()
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{args.port}",
+                timeout=120,
+                limits=httpx.Limits(max_connections=max(args.concurrency)),
+            ) as client:
+                await wait_ready(client, server)
+                process = psutil.Process(server.pid)
+                for endpoint in args.endpoints:
+                    for concurrency in args.concurrency:
+                        result = await run_level(
+                            client,
+                            endpoint,
+                            image,
+                            concurrency,
+                            args.duration,
+                            args.stream,
+                        )
+                        result["rss_mb"] = round(process.memory_info().rss / 2**20, 1)
+                        results.append(result)
+                        print(
+                            f"{endpoint} c={concurrency}: "
+                            f"{result['throughput_rps']} req/s, "
+                            f"p95 {result['latency_ms'].get('p95')} ms",
+                            file=sys.stderr,
+                        )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    report = {
+        "benchmark": "load",
+        **metadata(),
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "duration",
+                "image",
+                "size",
+                "stream",
+                "latency",
+                "jitter",
+                "chunk_delay",
+            )
+        },
+        "results": results,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Micro-benchmarks of per-request hot paths, printed as JSON.
+
+Covers ``load_image`` from a local URL, a data URI and raw base64,
+``_resize_image``, and building SSE/NDJSON streaming frames. Timings are
+per call, in microseconds.
+
+    uv run python benchmarks/micro.py [--repeat N] [--size WIDTHxHEIGHT]
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+from collections.abc import Callable
+
+from fake_moondream import ANSWER, install
+from harness import SRC, metadata, summarize
+from image_server import jpeg_bytes, serve_images
+
+sys.path.insert(0, str(SRC))
+
+from routes import _ChunkTemplate, _NDJSONTemplate  # noqa: E402
+from vision_service import VisionService, load_image  # noqa: E402
+
+
+def bench(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    func()  # warm caches and connections
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    result = summarize(timings, scale=1e6)
+    result["ops_per_s"] = round(len(timings) / sum(timings), 1)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--size", default="1920x1080", help="test image size")
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.size.split("x"))
+
+    install(latency=0.0)
+    service = VisionService(api_key="benchmark")
+    data = jpeg_bytes(width, height)
+    raw_base64 = base64.b64encode(data).decode()
+    data_uri = f"data:image/jpeg;base64,{raw_base64}"
+    large = load_image(
+        base64.b64encode(jpeg_bytes(width * 2, height * 2)).decode()
+    ).copy()
+    words = [word + " " for word in ANSWER.split(" ")]
+
+    def sse_stream() -> None:
+        chunks = _ChunkTemplate("chatcmpl-1", 1, "moondream")
+        for word in words:
+            chunks.delta(word)
+        chunks.finish("stop")
+
+    def ndjson_stream() -> None:
+        frames = _NDJSONTemplate("moondream", chat=True)
+        for word in words:
+            frames.frame(word)
+        frames.frame("", {"done": True, "eval_count": len(words)})
+
+    with serve_images() as base_url:
+        url = f"{base_url}/{width}x{height}.jpg"
+        results = {
+            "load_image_url": bench(lambda: load_image(url), args.repeat),
+            "load_image_data_uri": bench(lambda: load_image(data_uri), args.repeat),
+            "load_image_base64": bench(lambda: load_image(raw_base64), args.repeat),
+            "resize_image": bench(lambda: service._resize_image(large), args.repeat),
+            "sse_stream": bench(sse_stream, args.repeat * 20),
+            "ndjson_stream": bench(ndjson_stream, args.repeat * 20),
+        }
+    service.close()
+    report = {
+        "benchmark": "micro",
+        **metadata(),
+        "image": {"size": args.size, "jpeg_bytes": len(data)},
+        "results": results,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
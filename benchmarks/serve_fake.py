@@ -0,0 +1,38 @@
+"""
+Serve the API on localhost with the fake Moondream client (used by load.py).
+
+    uv run python benchmarks/serve_fake.py --port 8765 --latency 0.05
+"""
+
+import argparse
+import sys
+
+import uvicorn
+from fake_moondream import install
+from harness import SRC
+
+sys.path.insert(0, str(SRC))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    install(
+        latency=args.latency,
+        jitter=args.jitter,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed,
+    )
+    # Imported after install() so the lifespan builds fake clients
+    from api import app
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
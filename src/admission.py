@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from typing import Any
+
+import orjson
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from exceptions import VisionServiceError
+from metrics import ADMISSION_REJECTED
+from resilience import remaining
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class AdmissionRejected(VisionServiceError):
+    """Raised when a request is shed instead of being admitted."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; return 0, or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Global in-flight limit with a bounded, priority-ordered wait queue.
+
+    Up to ``max_in_flight`` requests run at once. Further requests wait (higher
+    priority first, FIFO within a priority) for at most ``queue_timeout``
+    seconds; when ``max_queue`` are already waiting, new ones are rejected
+    immediately. With ``client_rate`` > 0, each client key also gets a token
+    bucket of ``client_burst`` requests refilled at ``client_rate`` per second.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        client_rate: float = 0.0,
+        client_burst: float = 1.0,
+        max_clients: int = 10_000,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._seq = itertools.count()
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        # Smoothed time a request holds its slot, for Retry-After estimates
+        self._avg_hold = 1.0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rate_limited = 0
+
+    def _retry_after(self) -> float:
+        """Rough time until a slot frees up for a request joining the queue now."""
+        return self._avg_hold * (len(self._waiters) + 1) / self.max_in_flight
+
+    def check_rate(self, client: str | None) -> None:
+        """Take one of ``client``'s tokens, or raise ``AdmissionRejected``."""
+        if self.client_rate <= 0 or client is None:
+            return
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(
+                self.client_rate, self.client_burst
+            )
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        wait = bucket.take()
+        if wait > 0:
+            self.rate_limited += 1
+            ADMISSION_REJECTED.labels("rate_limited").inc()
+            raise AdmissionRejected(429, "Client rate limit exceeded", wait)
+
+    async def acquire(self, client: str | None = None, priority: int = 1) -> None:
+        """Wait for an in-flight slot, or raise ``AdmissionRejected``."""
+        self.check_rate(client)
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            ADMISSION_REJECTED.labels("queue_full").inc()
+            raise AdmissionRejected(
+                503, "Server busy: admission queue is full", self._retry_after()
+            )
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        self.queued += 1
+        # Never wait past the request's own deadline
+        left = remaining()
+        timeout = self.queue_timeout if left is None else min(self.queue_timeout, left)
+        try:
+            async with asyncio.timeout(max(0.0, timeout)):
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, TimeoutError):
+                self.rejected_timeout += 1
+                ADMISSION_REJECTED.labels("queue_timeout").inc()
+                raise AdmissionRejected(
+                    503, "Server busy: timed out waiting in queue", self._retry_after()
+                )
+            raise
+        self.admitted += 1
+
+    def release(self, held: float | None = None) -> None:
+        """Free a slot, handing it straight to the highest-priority waiter."""
+        if held is not None:
+            self._avg_hold += 0.2 * (held - self._avg_hold)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rate_limited": self.rate_limited,
+            "avg_hold_s": round(self._avg_hold, 3),
+        }
+
+
+def _header(scope: Scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _client_key(scope: Scope, api_keys: frozenset[str]) -> tuple[str | None, bool]:
+    """
+    Identify the client for rate limiting: an API key (``X-API-Key``, then
+    ``Authorization: Bearer``) from the ``api_keys`` allow-list or, failing
+    that, the peer address. Unlisted keys are ignored, since any client can
+    send a fresh one with each request. Also returns whether the client used
+    an allow-listed key.
+    """
+    api_key = _header(scope, b"x-api-key")
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        api_key = api_key or authorization[7:].strip()
+    if api_key and api_key in api_keys:
+        digest = hashlib.blake2b(api_key.encode(), digest_size=12).hexdigest()
+        return f"key:{digest}", True
+    client = scope.get("client")
+    return (f"ip:{client[0]}" if client else None), False
+
+
+class AdmissionMiddleware:
+    """
+    Admit inference requests (``POST`` outside ``exempt_paths``) through the
+    app's ``AdmissionController``; shed the rest with 429/503 and
+    ``Retry-After``. The slot is held until the response, including any
+    streamed body, has been sent. ``X-Priority`` is only honoured for
+    clients with a key from ``api_keys``; everyone else queues as normal.
+    ``POST`` requests to ``rate_only_paths`` take no slot but still count
+    against the client's rate limit.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        exempt_paths: frozenset[str],
+        api_keys: frozenset[str] = frozenset(),
+        rate_only_paths: frozenset[str] = frozenset(),
+    ) -> None:
+        self.app = app
+        self.exempt_paths = exempt_paths
+        self.api_keys = api_keys
+        self.rate_only_paths = rate_only_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        controller: AdmissionController | None = (
+            getattr(scope["app"].state, "admission", None)
+            if scope["type"] == "http"
+            else None
+        )
+        if (
+            controller is None
+            or scope["method"] != "POST"
+            or scope["path"] in self.exempt_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client, trusted = _client_key(scope, self.api_keys)
+        if scope["path"] in self.rate_only_paths:
+            try:
+                controller.check_rate(client)
+            except AdmissionRejected as e:
+                await self._reject(send, e)
+                return
+            await self.app(scope, receive, send)
+            return
+
+        priority = PRIORITIES["normal"]
+        if trusted:
+            priority = PRIORITIES.get(
+                (_header(scope, b"x-priority") or "normal").lower(), priority
+            )
+        try:
+            await controller.acquire(client, priority)
+        except AdmissionRejected as e:
+            await self._reject(send, e)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(time.monotonic() - start)
+
+    @staticmethod
+    async def _reject(send: Send, error: AdmissionRejected) -> None:
+        body = orjson.dumps({"detail": error.detail})
+        retry_after = max(1, math.ceil(error.retry_after))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": error.status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -3,7 +3,22 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from routes import default_router, ollama_router, openai_router
+from admission import AdmissionController, AdmissionMiddleware
+from config import settings
+from executor import shutdown_executor
+from http_client import create_http_client
+from jobs import JobQueue, SqliteJobStore
+from metrics import MetricsMiddleware, release_process_metrics
+from prefetcher import Prefetcher, default_lock_path, parse_watchlist
+from resilience import DeadlineMiddleware
+from responses import InstrumentedJSONResponse
+from routes import (
+    default_router,
+    jobs_router,
+    ollama_router,
+    openai_router,
+    vision_router,
+)
 from vision_service import get_vision_service
 
 
@@ -15,8 +30,62 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     _app.state.vision_service = service
     mode = "api" if service.api_key else "local"
     print(f"Vision service initialized: model={service.model_name}, mode={mode}")
+    if settings.WARMUP_ENABLED:
+        await service.warmup()
+    _app.state.admission = AdmissionController(
+        max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        client_rate=settings.CLIENT_RATE_LIMIT,
+        client_burst=settings.CLIENT_RATE_BURST,
+    )
+    # Shared, pooled client for image URL fetches
+    _app.state.http_client = create_http_client()
+    # Background analysis of watched camera snapshots
+    watchlist = parse_watchlist(settings.PREFETCH_WATCHLIST)
+    prefetcher = (
+        Prefetcher(
+            service,
+            _app.state.http_client,
+            watchlist,
+            # One worker process polls; the others stand by
+            lock_path=settings.PREFETCH_LOCK_PATH
+            or default_lock_path(settings.PREFETCH_WATCHLIST, settings.PORT),
+        )
+        if watchlist
+        else None
+    )
+    _app.state.prefetcher = prefetcher
+    if prefetcher is not None:
+        prefetcher.start()
+    # Bulk jobs, resumed from the on-disk queue
+    jobs = None
+    if settings.JOBS_ENABLED:
+        jobs = JobQueue(
+            service,
+            _app.state.http_client,
+            SqliteJobStore(settings.JOBS_PATH),
+            concurrency=settings.JOBS_CONCURRENCY,
+            lease=settings.JOBS_LEASE,
+            retention=settings.JOBS_RETENTION,
+            max_items=settings.JOBS_MAX_ITEMS,
+            # Room for a base64 image at MAX_IMAGE_BYTES plus prompt and JSON
+            max_line=settings.MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024,
+            item_deadline=settings.REQUEST_DEADLINE,
+        )
+        jobs.start()
+    _app.state.jobs = jobs
     yield
-    # Shutdown: nothing to clean up yet
+    # Shutdown: stop prefetching and bulk jobs, close pooled connections, then
+    # release the worker pool
+    if prefetcher is not None:
+        await prefetcher.stop()
+    if jobs is not None:
+        await jobs.stop()
+    await _app.state.http_client.aclose()
+    shutdown_executor()
+    service.close()
+    release_process_metrics()
 
 
 app = FastAPI(
@@ -24,7 +93,21 @@ app = FastAPI(
     description="OpenAI/Ollama-compatible Moondream API Service",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=InstrumentedJSONResponse,
+)
+app.add_middleware(
+    AdmissionMiddleware,
+    exempt_paths=frozenset({"/api/show"}),
+    # A job upload holds no inference slot; its items are paced by the workers
+    rate_only_paths=frozenset({"/v1/jobs"}),
+    api_keys=frozenset(
+        key.strip() for key in settings.CLIENT_API_KEYS.split(",") if key.strip()
+    ),
 )
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(openai_router, prefix="/v1")
 app.include_router(ollama_router, prefix="")
+app.include_router(vision_router, prefix="/v1/vision")
+app.include_router(jobs_router, prefix="/v1/jobs")
 app.include_router(default_router, prefix="")
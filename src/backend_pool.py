@@ -0,0 +1,266 @@
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from moondream.types import VLM as VLMClient
+
+from exceptions import ImageAnalysisError
+from metrics import served_by, serving
+from resilience import is_transient
+
+
+class Backend:
+    """
+    One Moondream client (local Photon or a cloud API key) with the latency
+    and failure bookkeeping the pool routes on.
+
+    The circuit breaker opens after ``failure_threshold`` consecutive
+    failures; once ``cooldown`` seconds have passed a single probe request is
+    let through, and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client: VLMClient,
+        *,
+        local: bool,
+        failure_threshold: int,
+        cooldown: float,
+        latency_window: int = 200,
+    ) -> None:
+        self.name = name
+        self.client = client
+        self.local = local
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ewma_latency: float | None = None
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def kind(self) -> str:
+        return "local" if self.local else "cloud"
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def start(self) -> None:
+        if self.state == "half_open":
+            self._probing = True
+        self.in_flight += 1
+        self.requests += 1
+
+    def succeeded(self, latency: float) -> None:
+        self.in_flight -= 1
+        self._probing = False
+        self.consecutive_failures = 0
+        self._latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += 0.2 * (latency - self.ewma_latency)
+
+    def failed(self) -> None:
+        self.in_flight -= 1
+        self._probing = False
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+    def completed(self) -> None:
+        """The backend answered, but with an error of the request's own making."""
+        self.in_flight -= 1
+        self._probing = False
+        self.consecutive_failures = 0
+
+    def abandoned(self) -> None:
+        """The caller stopped waiting (e.g. a hedge won); no verdict either way."""
+        self.in_flight -= 1
+        self._probing = False
+
+    def latency_percentile(self, percentile: float) -> float | None:
+        if len(self._latencies) < 10:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(percentile / 100 * len(ordered)) - 1)
+        return ordered[index]
+
+    def score(self) -> float:
+        """Expected wait: smoothed latency scaled by work already queued here."""
+        return (self.ewma_latency or 0.0) * (self.in_flight + 1)
+
+    def stats(self) -> dict[str, Any]:
+        p95 = self.latency_percentile(95)
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ewma_latency_ms": (
+                round(self.ewma_latency * 1000, 1) if self.ewma_latency else None
+            ),
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 else None,
+        }
+
+
+class BackendPool:
+    """
+    Route each call to the healthy backend with the lowest expected latency.
+
+    If the chosen backend fails, the call fails over to the next one. With
+    ``hedge_percentile`` set, a call still running after that percentile of
+    its backend's recent latencies (at least ``hedge_min_delay`` seconds) is
+    also sent to a second backend, and the first answer wins.
+    """
+
+    def __init__(
+        self,
+        backends: list[Backend],
+        *,
+        hedge_percentile: float | None = None,
+        hedge_min_delay: float = 0.0,
+    ) -> None:
+        self.backends = backends
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @property
+    def primary(self) -> Backend:
+        return self.backends[0]
+
+    def select(self, exclude: list[Backend] | None = None) -> Backend | None:
+        """Healthy backend with the lowest score; ties go to configured order."""
+        candidates = [
+            backend
+            for backend in self.backends
+            if backend.available() and (exclude is None or backend not in exclude)
+        ]
+        return min(candidates, key=Backend.score, default=None)
+
+    def _hedge_delay(self, backend: Backend) -> float | None:
+        if self.hedge_percentile is None or len(self.backends) < 2:
+            return None
+        latency = backend.latency_percentile(self.hedge_percentile)
+        return None if latency is None else max(self.hedge_min_delay, latency)
+
+    @contextmanager
+    def track(self, backend: Backend) -> Iterator[None]:
+        """
+        Record the outcome and latency of one call made on ``backend``. Only
+        transient errors (see ``is_transient``) count as backend failures; a
+        bad prompt or image is the request's fault, not the backend's. A
+        successful call marks ``backend`` as serving the current request in the
+        stage metrics.
+        """
+        backend.start()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_transient(e):
+                backend.failed()
+            else:
+                backend.completed()
+            raise
+        except BaseException:
+            backend.abandoned()
+            raise
+        backend.succeeded(time.monotonic() - start)
+        served_by(backend.kind)
+
+    async def _run[T](
+        self, backend: Backend, op: Callable[[Backend], Awaitable[T]]
+    ) -> T:
+        with self.track(backend), serving(backend.kind):
+            return await op(backend)
+
+    async def call[T](self, op: Callable[[Backend], Awaitable[T]]) -> T:
+        """
+        Run ``op`` on the best backend, failing over and hedging as configured.
+        Non-transient errors are raised as they are, without failing over.
+        """
+        backend = self.select()
+        if backend is None:
+            raise ImageAnalysisError("No healthy Moondream backend available")
+        tried = [backend]
+        tasks = {asyncio.ensure_future(self._run(backend, op)): backend}
+        hedge_delay = self._hedge_delay(backend)
+        hedge_at = None if hedge_delay is None else time.monotonic() + hedge_delay
+        error: BaseException | None = None
+        try:
+            while tasks:
+                timeout = None if hedge_at is None else hedge_at - time.monotonic()
+                done, _ = await asyncio.wait(
+                    tasks,
+                    timeout=None if timeout is None else max(0.0, timeout),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # Slow primary: hedge on a second backend
+                    hedge_at = None
+                    backup = self.select(tried)
+                    if backup is not None:
+                        self.hedges += 1
+                        tried.append(backup)
+                        tasks[asyncio.ensure_future(self._run(backup, op))] = backup
+                    continue
+                for task in done:
+                    winner = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if winner is not backend and len(tried) > 1:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if not is_transient(error):
+                        raise error
+                if not tasks:
+                    fallback = self.select(tried)
+                    if fallback is None:
+                        break
+                    self.failovers += 1
+                    tried.append(fallback)
+                    backend = fallback
+                    tasks[asyncio.ensure_future(self._run(fallback, op))] = fallback
+        finally:
+            for task in tasks:
+                task.cancel()
+        assert error is not None
+        raise error
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "backends": [backend.stats() for backend in self.backends],
+        }
+
+    def close(self) -> None:
+        for backend in self.backends:
+            backend.client.close()
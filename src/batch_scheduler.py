@@ -0,0 +1,170 @@
+import asyncio
+import contextvars
+import time
+from collections import Counter
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager, nullcontext
+from dataclasses import dataclass, field
+
+from moondream.types import EncodedImage
+from PIL import Image
+
+from executor import run_blocking
+from generation import NO_LIMITS, GenerationLimits
+
+
+@dataclass
+class _Job:
+    image: Image.Image | EncodedImage
+    prompt: str
+    limits: GenerationLimits
+    future: asyncio.Future[str]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # The submitter's context, so the job's stages are timed for its request
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class BatchScheduler:
+    """
+    Micro-batching queue in front of the local (Photon) Moondream client.
+
+    Jobs are dispatched in one of two modes:
+
+    - ``"batch"``: jobs are collected until ``max_batch_size`` are waiting or
+      the oldest has waited ``max_wait`` seconds, then submitted to the
+      engine together, so it can run them as one GPU batch, and collection
+      carries on while they run. At most ``max_batch_size`` jobs are in
+      flight, and a slow job only holds its own slot, not the jobs queued
+      behind it;
+    - ``"serial"``: each job runs as soon as it is dequeued, one after
+      another so the GPU is never shared.
+    """
+
+    def __init__(
+        self,
+        run_one: Callable[[Image.Image | EncodedImage, str, GenerationLimits], str],
+        *,
+        max_batch_size: int,
+        max_wait: float,
+        dispatch: str,
+    ) -> None:
+        self._run_one = run_one
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.dispatch = dispatch
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue()
+        self._gpu_lock = asyncio.Lock()
+        # In-flight limit of the "batch" dispatch mode
+        self._slots = asyncio.Semaphore(max_batch_size)
+        self._running: set[asyncio.Task[None]] = set()
+        self._worker: asyncio.Task[None] | None = None
+        self.batches = 0
+        self.jobs = 0
+        self.batch_sizes: Counter[int] = Counter()
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+    def exclusive(self) -> AbstractAsyncContextManager[object]:
+        """Context that keeps other GPU work out in serial mode (for streaming)."""
+        return self._gpu_lock if self.dispatch == "serial" else nullcontext()
+
+    async def submit(
+        self,
+        image: Image.Image | EncodedImage,
+        prompt: str,
+        limits: GenerationLimits = NO_LIMITS,
+    ) -> str:
+        """Queue one query and wait for its answer."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Job(image, prompt, limits, future))
+        return await future
+
+    async def _collect(self) -> list[_Job]:
+        batch = [await self._queue.get()]
+        if self.dispatch != "batch":
+            # Serial dispatch runs jobs one by one anyway; lingering for
+            # company would only delay them
+            return batch
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run_job(self, job: _Job) -> None:
+        if job.future.done():  # caller gave up while queued
+            return
+        try:
+            result = await run_blocking(
+                job.context.run, self._run_one, job.image, job.prompt, job.limits
+            )
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            now = time.monotonic()
+            for job in batch:
+                waited = now - job.enqueued_at
+                self.total_wait += waited
+                self.max_wait_seen = max(self.max_wait_seen, waited)
+            self.batches += 1
+            self.jobs += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            if self.dispatch == "batch":
+                for job in batch:
+                    await self._slots.acquire()
+                    task = asyncio.create_task(self._run_slot(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+            else:
+                for job in batch:
+                    async with self._gpu_lock:
+                        await self._run_job(job)
+
+    async def _run_slot(self, job: _Job) -> None:
+        try:
+            await self._run_job(job)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "dispatch": self.dispatch,
+            "queue_depth": self._queue.qsize(),
+            "running": len(self._running),
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "avg_wait_ms": round(self.total_wait / self.jobs * 1000, 2)
+            if self.jobs
+            else 0.0,
+            "max_wait_ms": round(self.max_wait_seen * 1000, 2),
+        }
+
+    def close(self) -> None:
+        """Stop dispatching and fail any queued jobs."""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for task in self._running:
+            task.cancel()
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.future.done():
+                job.future.cancel()
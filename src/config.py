@@ -9,7 +9,157 @@ class Settings:
         "MOONDREAM_MODE", "api"
     )  # 'api' or 'local' (Photon)
     MOONDREAM_API_KEY: str = os.getenv("MOONDREAM_API_KEY", "")
-    MAX_IMAGE_SIZE: int = 2048  # Longest edge, local (Photon) mode
+    MOONDREAM_BACKENDS: str = os.getenv(
+        "MOONDREAM_BACKENDS", ""
+    )  # e.g. 'local,cloud' in priority order; empty uses MOONDREAM_MODE
+    MOONDREAM_API_KEYS: str = os.getenv(
+        "MOONDREAM_API_KEYS", ""
+    )  # extra comma-separated cloud keys, one cloud backend each
+    HEDGE_PERCENTILE: float = float(
+        os.getenv("HEDGE_PERCENTILE", "0")
+    )  # hedge to a second backend past this latency percentile; 0 disables
+    HEDGE_MIN_DELAY_MS: float = float(os.getenv("HEDGE_MIN_DELAY_MS", "250"))
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_COOLDOWN: float = float(
+        os.getenv("BREAKER_COOLDOWN", "30")
+    )  # seconds a tripped backend stays out of rotation
+    MAX_IMAGE_SIZE: int = int(
+        os.getenv("MAX_IMAGE_SIZE", "2048")
+    )  # Longest edge, local (Photon) mode
+    MAX_IMAGE_BYTES: int = int(
+        os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024))
+    )  # Hard cap on encoded image size (download or base64 payload)
+    CLOUD_MAX_IMAGE_SIZE: int = int(
+        os.getenv("CLOUD_MAX_IMAGE_SIZE", "1280")
+    )  # Longest edge uploaded to the Moondream cloud (cloud-only pools)
+    UPLOAD_FORMAT: str = os.getenv("UPLOAD_FORMAT", "jpeg")  # 'jpeg' or 'webp'
+    UPLOAD_QUALITY: int = int(
+        os.getenv("UPLOAD_QUALITY", "85")
+    )  # Encoder quality of cloud uploads (the SDK default is JPEG at 95)
+    IMAGE_RESAMPLE: str = os.getenv(
+        "IMAGE_RESAMPLE", "lanczos"
+    )  # PIL filter: nearest, box, bilinear, hamming, bicubic, lanczos
+    HOST: str = os.getenv("HOST", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    WORKERS: int = int(
+        os.getenv("WORKERS", "1")
+    )  # Server processes started by server.py; each loads its own backends
+    IMAGE_PROCESS_WORKERS: int = int(
+        os.getenv("IMAGE_PROCESS_WORKERS", "0")
+    )  # Processes for image decode/resize; 0 decodes on the thread pool
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_CLOUD_INFERENCE: bool = (
+        os.getenv("WARMUP_CLOUD_INFERENCE", "false").lower() == "true"
+    )  # Also warm cloud backends, one billed call per key and worker
+    KEYFRAMES_MAX: int = int(
+        os.getenv("KEYFRAMES_MAX", "6")
+    )  # Frames of a clip, GIF or multi-frame image analysed at most
+    KEYFRAME_MIN_CHANGE: float = float(
+        os.getenv("KEYFRAME_MIN_CHANGE", "0.03")
+    )  # Accumulated change (0-1 per pixel) that earns a clip another keyframe
+    KEYFRAME_SAMPLE_FRAMES: int = int(
+        os.getenv("KEYFRAME_SAMPLE_FRAMES", "240")
+    )  # Evenly spaced frames scored per clip when picking keyframes
+    ROI_PADDING: float = float(
+        os.getenv("ROI_PADDING", "0.15")
+    )  # Context kept around a region of interest, as a share of its size
+    ROI_MIN_SIZE: int = int(
+        os.getenv("ROI_MIN_SIZE", "256")
+    )  # Smallest crop edge in source pixels; tiny regions get more context
+    WORKER_POOL_SIZE: int = int(
+        os.getenv("WORKER_POOL_SIZE", "32")
+    )  # Threads for blocking image loading and inference
+    MAX_CONCURRENT_INFERENCES: int = int(
+        os.getenv("MAX_CONCURRENT_INFERENCES", "16")
+    )  # Model calls in flight across all routes
+    LOCAL_BATCH_MAX_SIZE: int = int(os.getenv("LOCAL_BATCH_MAX_SIZE", "8"))
+    LOCAL_BATCH_MAX_WAIT_MS: float = float(os.getenv("LOCAL_BATCH_MAX_WAIT_MS", "10"))
+    LOCAL_BATCH_DISPATCH: str = os.getenv(
+        "LOCAL_BATCH_DISPATCH", "auto"
+    )  # 'auto', 'batch' or 'serial'
+    GENERATE_MAX_FANOUT: int = int(
+        os.getenv("GENERATE_MAX_FANOUT", "4")
+    )  # Images of one /api/generate request processed at once
+    ADMISSION_MAX_IN_FLIGHT: int = int(
+        os.getenv("ADMISSION_MAX_IN_FLIGHT", "32")
+    )  # Inference requests admitted at once; the rest wait in the queue
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(
+        os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")
+    )  # Seconds a request may wait for a slot before a 503
+    CLIENT_RATE_LIMIT: float = float(
+        os.getenv("CLIENT_RATE_LIMIT", "0")
+    )  # Requests/second per API key or client IP; 0 disables
+    CLIENT_RATE_BURST: float = float(os.getenv("CLIENT_RATE_BURST", "20"))
+    CLIENT_API_KEYS: str = os.getenv(
+        "CLIENT_API_KEYS", ""
+    )  # comma-separated keys that get their own rate limit and X-Priority
+    REQUEST_DEADLINE: float = float(
+        os.getenv("REQUEST_DEADLINE", "60")
+    )  # End-to-end seconds per request (X-Request-Timeout overrides); 0 disables
+    FETCH_DEADLINE_SHARE: float = float(
+        os.getenv("FETCH_DEADLINE_SHARE", "0.3")
+    )  # Fraction of the remaining budget an image fetch may use
+    RETRY_MAX_ATTEMPTS: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY_MS: float = float(os.getenv("RETRY_BASE_DELAY_MS", "100"))
+    RETRY_MAX_DELAY_MS: float = float(os.getenv("RETRY_MAX_DELAY_MS", "2000"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+    )
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_ENABLED: bool = (
+        os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    )
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+    RESPONSE_CACHE_MAX_BYTES: int = int(
+        os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+    )
+    RESPONSE_CACHE_PATH: str = os.getenv(
+        "RESPONSE_CACHE_PATH", ""
+    )  # sqlite file; empty keeps the cache in memory only
+    ENCODED_IMAGE_CACHE_ENABLED: bool = (
+        os.getenv("ENCODED_IMAGE_CACHE_ENABLED", "true").lower() == "true"
+    )
+    ENCODED_IMAGE_CACHE_TTL: float = float(os.getenv("ENCODED_IMAGE_CACHE_TTL", "30"))
+    ENCODED_IMAGE_CACHE_MAX_BYTES: int = int(
+        os.getenv("ENCODED_IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+    )
+    PREFETCH_WATCHLIST: str = os.getenv(
+        "PREFETCH_WATCHLIST", ""
+    )  # JSON list (or path to one) of {url, prompt, interval, freshness}
+    PREFETCH_LOCK_PATH: str = os.getenv(
+        "PREFETCH_LOCK_PATH", ""
+    )  # file locked by the one worker that prefetches; empty derives one
+    JOBS_ENABLED: bool = (
+        os.getenv("JOBS_ENABLED", "false").lower() == "true"
+    )  # The job API has no authentication of its own; enable it deliberately
+    JOBS_PATH: str = os.getenv(
+        "JOBS_PATH", "jobs.sqlite"
+    )  # sqlite queue of bulk jobs, shared by every worker process
+    JOBS_CONCURRENCY: int = int(
+        os.getenv("JOBS_CONCURRENCY", "8")
+    )  # Bulk job items analysed at once per worker process
+    JOBS_LEASE: float = float(
+        os.getenv("JOBS_LEASE", "30")
+    )  # Seconds before an item claimed by a dead worker is picked up again
+    JOBS_RETENTION: float = float(
+        os.getenv("JOBS_RETENTION", str(7 * 24 * 3600))
+    )  # Seconds a completed job's results are kept; 0 keeps them forever
+    JOBS_MAX_ITEMS: int = int(os.getenv("JOBS_MAX_ITEMS", "100000"))
+    NEAR_DUPLICATE_CACHE_ENABLED: bool = (
+        os.getenv("NEAR_DUPLICATE_CACHE_ENABLED", "false").lower() == "true"
+    )
+    NEAR_DUPLICATE_MAX_DISTANCE: int = int(
+        os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "4")
+    )  # Hamming distance (of 64 bits) still treated as the same scene
+    NEAR_DUPLICATE_TTL: float = float(os.getenv("NEAR_DUPLICATE_TTL", "60"))
+    NEAR_DUPLICATE_FRAMES_PER_SOURCE: int = int(
+        os.getenv("NEAR_DUPLICATE_FRAMES_PER_SOURCE", "8")
+    )
 
 
 settings = Settings()
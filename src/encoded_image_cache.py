@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from moondream.types import Base64EncodedImage, EncodedImage
+
+from single_flight import SingleFlight
+
+# Size charged for encoded images whose payload size we cannot measure
+_OPAQUE_ENTRY_BYTES = 1024 * 1024
+
+
+def _encoded_size(encoded: EncodedImage) -> int:
+    if isinstance(encoded, Base64EncodedImage):
+        return len(encoded.image_url)
+    return _OPAQUE_ENTRY_BYTES
+
+
+class EncodedImageCache:
+    """
+    Short-lived, memory-bounded cache of ``client.encode_image`` results.
+
+    Keyed by ``image_digest``, so several prompts about the same frame reuse
+    one encoding: the base64 JPEG upload payload in cloud mode, the bytes
+    handed to the Photon engine in local mode. Concurrent requests for the
+    same frame share a single encode.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[EncodedImage, int, float]] = OrderedDict()
+        self._size_bytes = 0
+        self._inflight: SingleFlight[EncodedImage] = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def _pop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size_bytes -= size
+
+    def get(self, key: str) -> EncodedImage | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        encoded, _, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return encoded
+
+    def set(self, key: str, encoded: EncodedImage) -> None:
+        if key in self._entries:
+            self._pop(key)
+        size = _encoded_size(encoded)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (encoded, size, time.monotonic() + self.ttl)
+        self._size_bytes += size
+        while self._size_bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def _encode(
+        self, key: str, encode: Callable[[], Awaitable[EncodedImage]]
+    ) -> EncodedImage:
+        encoded = await encode()
+        self.set(key, encoded)
+        return encoded
+
+    async def get_or_encode(
+        self, key: str, encode: Callable[[], Awaitable[EncodedImage]]
+    ) -> EncodedImage:
+        """Return the cached encoding for ``key`` or produce it exactly once."""
+        encoded = self.get(key)
+        if encoded is not None:
+            self.hits += 1
+            return encoded
+        if key in self._inflight:
+            # Waiting on another request's encode is not a cache hit
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return await self._inflight.do(key, lambda: self._encode(key, encode))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
@@ -14,3 +14,9 @@ class ImageLoadError(VisionServiceError):
     """Exception raised when image loading (URL/base64) fails."""
 
     pass
+
+
+class DeadlineExceeded(VisionServiceError):
+    """Exception raised when a request runs out of its time budget."""
+
+    pass
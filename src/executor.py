@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from collections.abc import AsyncGenerator, Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import cast
+
+from config import settings
+
+_executor: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.WORKER_POOL_SIZE,
+            thread_name_prefix="moondream-worker",
+        )
+    return _executor
+
+
+def get_process_pool() -> ProcessPoolExecutor | None:
+    """
+    Return the image process pool, creating it on first use, or ``None`` when
+    ``IMAGE_PROCESS_WORKERS`` is 0.
+    """
+    global _process_pool
+    if _process_pool is None and settings.IMAGE_PROCESS_WORKERS > 0:
+        # Spawn rather than fork: the server process already runs threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+async def run_in_process[*Ts, T](func: Callable[[*Ts], T], *args: *Ts) -> T:
+    """
+    Run a CPU-bound callable on the image process pool, outside this
+    process's GIL. ``func`` and its arguments and result must be picklable.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        raise RuntimeError("IMAGE_PROCESS_WORKERS is 0; no process pool")
+    return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+
+async def run_blocking[**P, T](
+    func: Callable[P, T], *args: P.args, **kwargs: P.kwargs
+) -> T:
+    """
+    Run a blocking callable on the shared worker pool.
+
+    Image fetching/decoding and Moondream inference are synchronous; running
+    them here keeps the event loop free to serve other requests (and
+    ``/health``) while they are in flight.
+    """
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the metrics route label) into the worker
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+_END = object()
+
+
+async def iterate_blocking[**P, T](
+    func: Callable[P, Iterator[T]], *args: P.args, **kwargs: P.kwargs
+) -> AsyncGenerator[T, None]:
+    """
+    Drive a blocking iterator on the shared worker pool and yield its items.
+
+    Items are handed to the event loop as soon as the worker produces them.
+    If the consumer stops early (client disconnect, ``aclose``), the worker
+    stops pulling and closes the iterator, which lets generator-based
+    sources release their upstream connection.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[tuple[object, BaseException | None]] = asyncio.Queue()
+    stopped = threading.Event()
+
+    def publish(item: object, error: BaseException | None = None) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:  # loop already closed
+            stopped.set()
+
+    def produce() -> None:
+        try:
+            iterator = func(*args, **kwargs)
+            try:
+                for item in iterator:
+                    if stopped.is_set():
+                        break
+                    publish(item)
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+        except BaseException as e:
+            publish(_END, e)
+        else:
+            publish(_END)
+
+    loop.run_in_executor(get_executor(), contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield cast(T, item)
+    finally:
+        stopped.set()
+
+
+def shutdown_executor() -> None:
+    """Stop the worker pools, dropping any work that has not started yet."""
+    global _executor, _process_pool
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
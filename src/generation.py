@@ -0,0 +1,97 @@
+import math
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from moondream.types import SamplingSettings
+
+
+@dataclass(frozen=True)
+class GenerationLimits:
+    """
+    Per-request generation settings: ``max_tokens`` and ``temperature`` go to
+    the SDK's ``SamplingSettings``; ``stop`` sequences are matched here, on
+    the streamed answer.
+    """
+
+    max_tokens: int | None = None
+    temperature: float | None = None
+    stop: tuple[str, ...] = ()
+
+    def sampling_settings(self) -> SamplingSettings | None:
+        settings: SamplingSettings = {}
+        if self.max_tokens is not None:
+            settings["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            settings["temperature"] = self.temperature
+        return settings or None
+
+    def prompt_key(self, prompt: str) -> str:
+        """
+        ``prompt`` tagged with these limits, for the answer caches; untouched
+        for the defaults, so existing cache keys still match.
+        """
+        return prompt if self == NO_LIMITS else f"{prompt}\0{self!r}"
+
+
+NO_LIMITS = GenerationLimits()
+
+
+def generation_limits(
+    max_tokens: int | None = None,
+    temperature: float | None = None,
+    stop: str | Iterable[str] | None = None,
+) -> GenerationLimits:
+    """
+    Build limits from request fields. A ``max_tokens`` of zero or less means
+    no limit, like Ollama's ``num_predict`` of ``-1``.
+    """
+    if max_tokens is not None and max_tokens <= 0:
+        max_tokens = None
+    stops = (stop,) if isinstance(stop, str) else tuple(stop or ())
+    return GenerationLimits(
+        max_tokens, temperature, tuple(dict.fromkeys(s for s in stops if s))
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of generated text (about four characters a token)."""
+    return math.ceil(len(text) / 4)
+
+
+class StopMatcher:
+    """
+    Find the first stop sequence in a streamed answer.
+
+    ``feed`` returns the part of the text so far that is safe to emit. Any
+    tail that could be the start of a stop sequence is held back until the
+    next chunk settles it, so no text past a stop sequence ever leaves.
+    """
+
+    def __init__(self, stops: tuple[str, ...]) -> None:
+        self.stops = stops
+        self.stopped = False
+        self._held = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self._held + chunk
+        matches = [i for i in (text.find(stop) for stop in self.stops) if i >= 0]
+        if matches:
+            self.stopped = True
+            self._held = ""
+            return text[: min(matches)]
+        held = max(_partial_match(text, stop) for stop in self.stops)
+        self._held = text[len(text) - held :]
+        return text[: len(text) - held]
+
+    def flush(self) -> str:
+        """The held-back tail, once the answer ended without a stop sequence."""
+        held, self._held = self._held, ""
+        return held
+
+
+def _partial_match(text: str, stop: str) -> int:
+    """Length of the longest end of ``text`` that ``stop`` starts with."""
+    for length in range(min(len(stop) - 1, len(text)), 0, -1):
+        if text.endswith(stop[:length]):
+            return length
+    return 0
@@ -0,0 +1,60 @@
+import importlib.util
+import os
+
+import httpx
+
+from config import resolve_proxy, settings
+
+
+def _no_proxy_patterns() -> list[str]:
+    """Translate ``NO_PROXY`` into httpx mount patterns that bypass the proxy."""
+    raw = os.environ.get("NO_PROXY") or os.environ.get("no_proxy") or ""
+    patterns: list[str] = []
+    for host in (h.strip() for h in raw.split(",")):
+        if not host:
+            continue
+        if host == "*":
+            return ["all://"]
+        host = host.lstrip(".")
+        patterns.extend((f"all://{host}", f"all://*.{host}"))
+    return patterns
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Build the long-lived client used to fetch image URLs.
+
+    Proxies are resolved once here rather than per request: each distinct
+    proxy (and the direct route for ``NO_PROXY`` hosts) gets its own
+    transport, and every transport keeps a keep-alive pool per host. HTTP/2 is
+    negotiated when the optional ``h2`` package is installed.
+    """
+    http2 = settings.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    transports: dict[str | None, httpx.AsyncHTTPTransport] = {}
+
+    def transport_for(proxy: str | None) -> httpx.AsyncHTTPTransport:
+        if proxy not in transports:
+            transports[proxy] = httpx.AsyncHTTPTransport(
+                proxy=proxy, http2=http2, limits=limits
+            )
+        return transports[proxy]
+
+    mounts: dict[str, httpx.AsyncBaseTransport | None] = {
+        "http://": transport_for(resolve_proxy("http://")),
+        "https://": transport_for(resolve_proxy("https://")),
+    }
+    for pattern in _no_proxy_patterns():
+        mounts[pattern] = transport_for(None)
+
+    return httpx.AsyncClient(
+        mounts=mounts,
+        timeout=httpx.Timeout(
+            settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+        ),
+        trust_env=False,
+    )
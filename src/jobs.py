@@ -0,0 +1,508 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import AsyncIterable, AsyncIterator, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+import orjson
+
+from executor import run_blocking
+from resilience import limit_deadline
+from vision_service import VisionService, load_image_async
+
+# Manifest lines are inserted in batches of this many rows
+_INSERT_BATCH = 500
+# Seconds idle workers and following readers wait before re-checking the
+# store for work or results written by another worker process
+_POLL_INTERVAL = 1.0
+# Uploads that never completed (the process died mid-way) are dropped after
+_STALE_UPLOAD = 24 * 3600.0
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id TEXT PRIMARY KEY, model TEXT NOT NULL, created_at REAL NOT NULL, "
+    "total INTEGER, finished_at REAL)",
+    # Work still to do: one row per image until it is answered
+    "CREATE TABLE IF NOT EXISTS items ("
+    "job_id TEXT NOT NULL, idx INTEGER NOT NULL, image TEXT NOT NULL, "
+    "prompt TEXT NOT NULL, status TEXT NOT NULL, owner TEXT, lease_until REAL, "
+    "PRIMARY KEY (job_id, idx))",
+    "CREATE INDEX IF NOT EXISTS items_status ON items (status)",
+    # Finished items, in completion order; ``seq`` is the stream cursor
+    "CREATE TABLE IF NOT EXISTS results ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, "
+    "idx INTEGER NOT NULL, source TEXT, prompt TEXT NOT NULL, answer TEXT, "
+    "error TEXT)",
+    "CREATE INDEX IF NOT EXISTS results_job ON results (job_id, seq)",
+)
+
+
+class ManifestError(ValueError):
+    """Raised for a malformed bulk job manifest."""
+
+
+@dataclass
+class JobItem:
+    """One claimed manifest line."""
+
+    job_id: str
+    index: int
+    image: str
+    prompt: str
+
+
+class SqliteJobStore:
+    """
+    Durable job queue shared by every worker process.
+
+    Items are claimed with a lease that the owning process keeps renewing; an
+    item whose owner died becomes claimable again once its lease runs out,
+    which is how work resumes after a crash or restart.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        stale = [
+            row[0]
+            for row in self._query(
+                "SELECT id FROM jobs WHERE total IS NULL AND created_at < ?",
+                (time.time() - _STALE_UPLOAD,),
+            )
+        ]
+        for job_id in stale:
+            self.delete(job_id)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple[Any, ...] = ()) -> list[tuple[Any, ...]]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, model: str) -> str:
+        """Register a job whose items are still being uploaded."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, model, created_at) VALUES (?, ?, ?)",
+                (job_id, model, time.time()),
+            )
+        return job_id
+
+    def add_items(self, job_id: str, start: int, items: list[tuple[str, str]]) -> None:
+        """Stage manifest lines; they are not claimable until ``seal``."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO items (job_id, idx, image, prompt, status) "
+                "VALUES (?, ?, ?, ?, 'staged')",
+                [
+                    (job_id, start + offset, image, prompt)
+                    for offset, (image, prompt) in enumerate(items)
+                ],
+            )
+
+    def seal(self, job_id: str, total: int) -> None:
+        """Finish the upload: queue every staged item of the job at once."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE items SET status = 'pending' WHERE job_id = ?", (job_id,)
+            )
+            conn.execute(
+                "UPDATE jobs SET total = ?, finished_at = ? WHERE id = ?",
+                (total, time.time() if total == 0 else None, job_id),
+            )
+
+    def claim(self, owner: str, lease: float) -> JobItem | None:
+        """Take an abandoned item, else the oldest pending one, for ``owner``."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE items SET status = 'running', owner = ?, lease_until = ? "
+                "WHERE rowid = COALESCE("
+                "(SELECT rowid FROM items WHERE status = 'running' "
+                "AND lease_until < ? LIMIT 1), "
+                "(SELECT rowid FROM items WHERE status = 'pending' "
+                "ORDER BY rowid LIMIT 1)) "
+                "RETURNING job_id, idx, image, prompt",
+                (owner, now + lease, now),
+            ).fetchone()
+        return JobItem(*row) if row else None
+
+    def renew(self, owner: str, lease: float) -> None:
+        """Extend the leases of every item ``owner`` is working on."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE items SET lease_until = ? "
+                "WHERE owner = ? AND status = 'running'",
+                (time.time() + lease, owner),
+            )
+
+    def release(self, owner: str) -> None:
+        """Hand ``owner``'s unfinished items back to the queue (clean shutdown)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE items SET status = 'pending', owner = NULL, lease_until = NULL "
+                "WHERE owner = ? AND status = 'running'",
+                (owner,),
+            )
+
+    def finish(
+        self, item: JobItem, owner: str, answer: str | None, error: str | None
+    ) -> bool:
+        """
+        Record an item's outcome; ``False`` if it is no longer ``owner``'s
+        (the job was deleted, or the lease lapsed and another worker took it).
+        """
+        source = item.image if item.image.startswith(("http://", "https://")) else None
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM items WHERE job_id = ? AND idx = ? AND owner = ?",
+                (item.job_id, item.index, owner),
+            ).rowcount
+            if not deleted:
+                return False
+            conn.execute(
+                "INSERT INTO results (job_id, idx, source, prompt, answer, error) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (item.job_id, item.index, source, item.prompt, answer, error),
+            )
+            if not conn.execute(
+                "SELECT 1 FROM items WHERE job_id = ? LIMIT 1", (item.job_id,)
+            ).fetchone():
+                conn.execute(
+                    "UPDATE jobs SET finished_at = ? WHERE id = ?",
+                    (time.time(), item.job_id),
+                )
+        return True
+
+    def status(self, job_id: str) -> dict[str, Any] | None:
+        """Progress counters of a job, or ``None`` if there is no such job."""
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT model, created_at, total, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict(
+                self._conn.execute(
+                    "SELECT status, COUNT(*) FROM items WHERE job_id = ? "
+                    "GROUP BY status",
+                    (job_id,),
+                ).fetchall()
+            )
+            done, failed = self._conn.execute(
+                "SELECT COUNT(*), COUNT(error) FROM results WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        model, created_at, total, finished_at = job
+        running = counts.get("running", 0)
+        if total is None:
+            state = "uploading"
+        elif finished_at is not None:
+            state = "completed"
+        elif running or done:
+            state = "running"
+        else:
+            state = "queued"
+        return {
+            "id": job_id,
+            "model": model,
+            "status": state,
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "total": total or 0,
+            "pending": counts.get("pending", 0),
+            "running": running,
+            "succeeded": done - failed,
+            "failed": failed,
+        }
+
+    def results(
+        self, job_id: str, after: int, limit: int = _INSERT_BATCH
+    ) -> list[dict[str, Any]]:
+        """Finished items of a job with ``seq`` greater than ``after``."""
+        rows = self._query(
+            "SELECT seq, idx, source, prompt, answer, error FROM results "
+            "WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after, limit),
+        )
+        return [
+            {
+                "seq": seq,
+                "index": index,
+                "image": source,
+                "prompt": prompt,
+                "answer": answer,
+                "error": error,
+            }
+            for seq, index, source, prompt, answer, error in rows
+        ]
+
+    def delete(self, job_id: str) -> bool:
+        """Drop a job with its queued items and results."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM results WHERE job_id = ?", (job_id,))
+            return conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount > 0
+
+    def purge(self, finished_before: float) -> None:
+        """Delete jobs that completed before ``finished_before``."""
+        for (job_id,) in self._query(
+            "SELECT id FROM jobs WHERE finished_at < ?", (finished_before,)
+        ):
+            self.delete(job_id)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _manifest_item(
+    line: bytes, number: int, default_prompt: str | None
+) -> tuple[str, str]:
+    try:
+        entry = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise ManifestError(f"Line {number}: invalid JSON ({e})") from None
+    if not isinstance(entry, dict):
+        raise ManifestError(f"Line {number}: expected an object")
+    image = entry.get("image")
+    prompt = entry.get("prompt", default_prompt)
+    if not isinstance(image, str) or not image:
+        raise ManifestError(f"Line {number}: 'image' must be a non-empty string")
+    if not isinstance(prompt, str) or not prompt:
+        raise ManifestError(f"Line {number}: no prompt")
+    return image, prompt
+
+
+async def _manifest_lines(
+    chunks: AsyncIterable[bytes], max_line: int
+) -> AsyncIterator[bytes]:
+    """Split a streamed NDJSON body into non-blank lines of at most ``max_line``."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            if end - start > max_line:
+                raise ManifestError("Manifest line too long")
+            line = bytes(buffer[start:end]).strip()
+            if line:
+                yield line
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line:
+            raise ManifestError("Manifest line too long")
+    if buffer.strip():
+        yield bytes(buffer).strip()
+
+
+class JobQueue:
+    """
+    Run bulk jobs from a ``SqliteJobStore`` in the background.
+
+    ``concurrency`` workers each claim one item at a time and analyse it
+    through the vision service, so jobs share its caches, backend pool and
+    inference limit with interactive requests. Each item gets its own
+    ``item_deadline`` seconds; failures are recorded per item and never stop
+    the job.
+    """
+
+    def __init__(
+        self,
+        service: VisionService,
+        http_client: httpx.AsyncClient | None,
+        store: SqliteJobStore,
+        *,
+        concurrency: int,
+        lease: float,
+        retention: float,
+        max_items: int,
+        max_line: int,
+        item_deadline: float,
+    ) -> None:
+        self.service = service
+        self.http_client = http_client
+        self.store = store
+        self.concurrency = concurrency
+        self.lease = lease
+        self.retention = retention
+        self.max_items = max_items
+        self.max_line = max_line
+        self.item_deadline = item_deadline
+        self.owner = uuid.uuid4().hex
+        self.processed = 0
+        self.failed = 0
+        self.active = 0
+        self._tasks: list[asyncio.Task[None]] = []
+        # Replaced on every signal, so each waiter sees the one it started on
+        self._work_added = asyncio.Event()
+        self._progress = asyncio.Event()
+
+    def start(self) -> None:
+        for _ in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._work()))
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await run_blocking(self.store.release, self.owner)
+        self.store.close()
+
+    @staticmethod
+    def _signal(event: asyncio.Event) -> asyncio.Event:
+        event.set()
+        return asyncio.Event()
+
+    async def _wait(self, event: asyncio.Event) -> None:
+        try:
+            async with asyncio.timeout(_POLL_INTERVAL):
+                await event.wait()
+        except TimeoutError:
+            pass
+
+    async def submit(
+        self, chunks: AsyncIterable[bytes], default_prompt: str | None
+    ) -> str:
+        """
+        Store an NDJSON manifest of ``{"image", "prompt"?}`` lines as a new job
+        and queue it; ``ManifestError`` on a malformed or oversized manifest.
+        """
+        job_id = await run_blocking(self.store.create, self.service.model_name)
+        total = 0
+        batch: list[tuple[str, str]] = []
+        try:
+            async for line in _manifest_lines(chunks, self.max_line):
+                batch.append(_manifest_item(line, total + 1, default_prompt))
+                total += 1
+                if total > self.max_items:
+                    raise ManifestError(f"Manifest exceeds {self.max_items} items")
+                if len(batch) >= _INSERT_BATCH:
+                    await run_blocking(
+                        self.store.add_items, job_id, total - len(batch), batch
+                    )
+                    batch = []
+            if batch:
+                await run_blocking(
+                    self.store.add_items, job_id, total - len(batch), batch
+                )
+            await run_blocking(self.store.seal, job_id, total)
+        except BaseException:
+            await asyncio.shield(run_blocking(self.store.delete, job_id))
+            raise
+        self._work_added = self._signal(self._work_added)
+        return job_id
+
+    async def status(self, job_id: str) -> dict[str, Any] | None:
+        return await run_blocking(self.store.status, job_id)
+
+    async def delete(self, job_id: str) -> bool:
+        return await run_blocking(self.store.delete, job_id)
+
+    async def follow(
+        self, job_id: str, after: int = 0, wait: bool = True
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yield a job's results after cursor ``after``; with ``wait``, keep
+        following until the job completes (or is deleted).
+        """
+        while True:
+            progress = self._progress
+            rows = await run_blocking(self.store.results, job_id, after)
+            for row in rows:
+                yield row
+            if rows:
+                after = rows[-1]["seq"]
+                continue
+            if not wait:
+                return
+            status = await self.status(job_id)
+            if status is None or status["status"] == "completed":
+                # Results written just before completion are read first
+                rows = await run_blocking(self.store.results, job_id, after)
+                if not rows:
+                    return
+                continue
+            await self._wait(progress)
+
+    async def _work(self) -> None:
+        while True:
+            work_added = self._work_added
+            try:
+                item = await run_blocking(self.store.claim, self.owner, self.lease)
+            except sqlite3.Error as e:
+                print(f"Job queue claim failed: {e}")
+                item = None
+            if item is None:
+                await self._wait(work_added)
+                continue
+            # A task per item gives each its own deadline context
+            await asyncio.create_task(self._process(item))
+
+    async def _process(self, item: JobItem) -> None:
+        limit_deadline(self.item_deadline)
+        self.active += 1
+        answer = error = None
+        try:
+            image = await load_image_async(item.image, self.http_client)
+            answer = await self.service.analyze_image_async(image, item.prompt)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        finally:
+            self.active -= 1
+        try:
+            finished = await run_blocking(
+                self.store.finish, item, self.owner, answer, error
+            )
+        except sqlite3.Error as e:
+            # The lease runs out and another worker retries the item
+            print(f"Job queue could not record item {item.index}: {e}")
+            return
+        if finished:
+            self.processed += 1
+            if error is not None:
+                self.failed += 1
+        self._progress = self._signal(self._progress)
+
+    async def _maintain(self) -> None:
+        """Renew this worker's leases and drop expired jobs."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await run_blocking(self.store.renew, self.owner, self.lease)
+                if self.retention > 0:
+                    await run_blocking(self.store.purge, time.time() - self.retention)
+            except sqlite3.Error as e:
+                print(f"Job queue maintenance failed: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.concurrency,
+            "active": self.active,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
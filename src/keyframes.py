@@ -0,0 +1,264 @@
+import importlib.util
+import io
+import math
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from exceptions import ImageLoadError
+
+# Edge of the grayscale thumbnails frames are scored on
+_THUMBNAIL_SIZE = 64
+# Per-pixel change (0-1) ignored when comparing thumbnails: sensor noise,
+# compression flicker and small exposure shifts stay below it
+_PIXEL_NOISE = 0.08
+# Formats PIL can hold several frames in (GIF, APNG, animated WebP, TIFF)
+_MULTI_FRAME_SIGNATURES = (b"GIF8", b"\x89PNG", b"II*\x00", b"MM\x00*")
+
+
+def is_video(head: bytes) -> bool:
+    """Whether ``head`` starts like an MP4/MOV or Matroska/WebM clip."""
+    return head[4:8] == b"ftyp" or head.startswith(b"\x1a\x45\xdf\xa3")
+
+
+def may_have_frames(head: bytes) -> bool:
+    """Cheap signature check: could this payload hold more than one frame?"""
+    return (
+        is_video(head)
+        or head.startswith(_MULTI_FRAME_SIGNATURES)
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
+
+
+def is_multi_frame(data: bytes) -> bool:
+    """Whether ``data`` is a clip or an image with more than one frame."""
+    if is_video(data[:12]):
+        return True
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return bool(getattr(image, "is_animated", False))
+    except Exception:
+        # Not ours to report; the still-image decoder raises the real error
+        return False
+
+
+@dataclass
+class Keyframe:
+    """A frame picked for analysis, with its position in the clip."""
+
+    index: int
+    timestamp: float | None
+    image: Image.Image
+
+
+@dataclass
+class Clip:
+    """The keyframes of a clip or animation, in playback order."""
+
+    frames: list[Keyframe]
+    frame_count: int  # frames scored (after sampling)
+    end: float | None  # timestamp of the last scored frame
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.frames[0].image.size
+
+
+def _pil_frames(data: bytes, stride: int) -> Iterator[tuple[int, float | None, Any]]:
+    with Image.open(io.BytesIO(data)) as image:
+        elapsed = 0.0
+        timed = False
+        for index in range(getattr(image, "n_frames", 1)):
+            image.seek(index)
+            duration = image.info.get("duration")
+            if index % stride == 0:
+                yield index, elapsed if timed or duration else None, image
+            if duration:
+                timed = True
+                elapsed = round(elapsed + duration / 1000, 3)
+
+
+def _video_frames(data: bytes, stride: int) -> Iterator[tuple[int, float | None, Any]]:
+    import av
+
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        for index, frame in enumerate(container.decode(stream)):
+            if index % stride == 0:
+                yield index, frame.time, frame
+
+
+def _estimated_frames(data: bytes) -> int | None:
+    """Frame count from the container header, if it records one."""
+    if not is_video(data[:12]):
+        with Image.open(io.BytesIO(data)) as image:
+            return getattr(image, "n_frames", 1)
+    import av
+
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        if stream.frames:
+            return stream.frames
+        if container.duration and stream.average_rate:
+            return math.ceil(container.duration / 1e6 * stream.average_rate)
+    return None
+
+
+def _frames(data: bytes, stride: int) -> Iterator[tuple[int, float | None, Any]]:
+    if is_video(data[:12]):
+        return _video_frames(data, stride)
+    return _pil_frames(data, stride)
+
+
+def _to_image(frame: Any) -> Image.Image:
+    if isinstance(frame, Image.Image):
+        return frame.convert("RGB")
+    return frame.to_image()
+
+
+def _thumbnail(frame: Any) -> np.ndarray:
+    """
+    Square grayscale thumbnail of a frame as 0-1 floats; a fixed shape keeps
+    frames of different sizes (e.g. TIFF pages) comparable.
+    """
+    size = (_THUMBNAIL_SIZE, _THUMBNAIL_SIZE)
+    if isinstance(frame, Image.Image):
+        pixels = np.asarray(frame.convert("L").resize(size, Image.Resampling.BOX))
+    else:
+        # Let the video decoder scale and drop chroma in one pass
+        pixels = frame.to_ndarray(width=size[0], height=size[1], format="gray")
+    return pixels.astype(np.float32) / 255
+
+
+def change_scores(thumbnails: np.ndarray) -> np.ndarray:
+    """
+    How much each frame changed from the previous one: the mean absolute
+    per-pixel difference, counting only pixels that changed by more than
+    ``_PIXEL_NOISE``. ``thumbnails`` is an ``(n, h, w)`` stack; the result has
+    ``n - 1`` entries.
+    """
+    change = np.abs(np.diff(thumbnails, axis=0))
+    change[change <= _PIXEL_NOISE] = 0.0
+    return change.mean(axis=(1, 2))
+
+
+def select_keyframes(scores: np.ndarray, k: int, min_change: float) -> list[int]:
+    """
+    Pick up to ``k`` frame indices from ``change_scores`` output.
+
+    The clip is cut into segments of equal accumulated change, one per
+    ``min_change`` of total change (so a static clip yields a single
+    segment) and at most ``k``; each segment contributes its frame with the
+    sharpest change, i.e. the scene cut or the peak of the motion. A single
+    frame adds at most ``min_change``, so one hard cut does not take every
+    segment from steady motion elsewhere in the clip.
+    """
+    if min_change > 0:
+        scores_capped = np.minimum(scores, min_change)
+        total = float(scores_capped.sum())
+        segments = max(1, min(k, int(total / min_change)))
+    else:
+        scores_capped = scores
+        total = float(scores.sum())
+        segments = k
+    if segments == 1 or total == 0:
+        return [0]
+    # Frame i + 1 has accumulated cumulative[i] of change since frame 0
+    cumulative = np.cumsum(scores_capped)
+    thresholds = np.arange(1, segments) * (total / segments)
+    starts = np.searchsorted(cumulative, thresholds) + 1
+    bounds = np.unique(np.concatenate(([0], starts, [len(scores) + 1])))
+    # Frame 0 opens the first segment whatever its score
+    frame_scores = np.concatenate(([np.inf], scores))
+    return [
+        int(start + np.argmax(frame_scores[start:end]))
+        for start, end in zip(bounds[:-1], bounds[1:])
+        if end > start
+    ]
+
+
+def extract_clip(data: bytes, k: int, min_change: float, max_frames: int) -> Clip:
+    """
+    Decode a clip or animation and keep its ``k`` most informative frames.
+
+    At most ``max_frames`` evenly spaced frames are scored on small grayscale
+    thumbnails. The chosen frames are then decoded at full size in a second
+    pass, so only ``k`` full frames are ever held in memory.
+    """
+    if is_video(data[:12]) and importlib.util.find_spec("av") is None:
+        raise ImageLoadError(
+            "Video input requires the optional 'av' package "
+            "(install the 'video' extra: uv sync --extra video)"
+        )
+    total = _estimated_frames(data)
+    stride = max(1, math.ceil(total / max_frames)) if total else 1
+    indices: list[int] = []
+    timestamps: list[float | None] = []
+    thumbnails: list[np.ndarray] = []
+    for index, timestamp, frame in _frames(data, stride):
+        indices.append(index)
+        timestamps.append(timestamp)
+        thumbnails.append(_thumbnail(frame))
+        if len(thumbnails) >= max_frames:
+            break
+    if not thumbnails:
+        raise ImageLoadError("Failed to load image: no frames decoded")
+
+    if len(thumbnails) == 1:
+        chosen = [0]
+    else:
+        chosen = select_keyframes(change_scores(np.stack(thumbnails)), k, min_change)
+    wanted = {indices[position]: position for position in chosen}
+    frames = []
+    for index, _, frame in _frames(data, 1):
+        position = wanted.get(index)
+        if position is not None:
+            frames.append(Keyframe(index, timestamps[position], _to_image(frame)))
+            if len(frames) == len(wanted):
+                break
+    return Clip(frames, len(thumbnails), timestamps[-1])
+
+
+def build_timeline(clip: Clip, answers: list[str]) -> list[dict[str, Any]]:
+    """
+    Pair keyframes with their answers; consecutive keyframes with the same
+    answer are merged into one entry spanning both.
+    """
+    entries: list[dict[str, Any]] = []
+    for frame, answer in zip(clip.frames, answers):
+        if entries and entries[-1]["answer"] == answer:
+            continue
+        if entries:
+            entries[-1]["end"] = frame.timestamp
+        entries.append(
+            {
+                "frame": frame.index,
+                "start": frame.timestamp,
+                "end": None,
+                "answer": answer,
+            }
+        )
+    if entries and len(answers) == len(clip.frames):
+        entries[-1]["end"] = clip.end
+    return entries
+
+
+def format_entry(entry: dict[str, Any]) -> str:
+    """One timeline line: ``[1.5s-4.0s] answer`` (frame numbers if untimed)."""
+    start, end = entry["start"], entry["end"]
+    if start is None:
+        label = f"frame {entry['frame']}"
+    elif end is None or end <= start:
+        label = f"{start:.1f}s"
+    else:
+        label = f"{start:.1f}s-{end:.1f}s"
+    return f"[{label}] {entry['answer']}"
+
+
+def format_timeline(entries: list[dict[str, Any]]) -> str:
+    """The timeline as text, one ``format_entry`` line per entry."""
+    return "\n".join(format_entry(entry) for entry in entries)
@@ -0,0 +1,352 @@
+import heapq
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+_DIMENSION_BUCKETS = (160, 320, 640, 1024, 1280, 1920, 2560, 3840, 5120, 7680)
+
+STAGE_DURATION = Histogram(
+    "moondream_stage_duration_seconds",
+    "Time each request spent in each stage (fetch, decode, resize, encode, "
+    "inference, serialize; load and answer on the Ollama routes; other outside "
+    "any stage), split so that a request's stages sum to its duration, by the "
+    "kind of backend that answered it (local, cloud, mixed or none)",
+    ["route", "mode", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+ERRORS = Counter(
+    "moondream_errors",
+    "Errors by exception class, counted once in the stage that raised them",
+    ["route", "stage", "error"],
+)
+REQUESTS = Counter(
+    "moondream_requests",
+    "Completed HTTP requests by route and status code",
+    ["route", "status"],
+)
+IN_FLIGHT = Gauge(
+    "moondream_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+STAGE_IN_FLIGHT = Gauge(
+    "moondream_stage_in_flight",
+    "Operations currently inside each request stage",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+BYTES_INGESTED = Counter(
+    "moondream_image_bytes_ingested",
+    "Encoded image bytes received, by source kind (url, base64)",
+    ["route", "kind"],
+)
+RETRIES = Counter(
+    "moondream_retries",
+    "Retries of transient fetch/inference failures",
+    ["operation"],
+)
+RETRY_GIVE_UPS = Counter(
+    "moondream_retry_give_ups",
+    "Transient failures not retried, by reason (deadline, attempts)",
+    ["operation", "reason"],
+)
+ADMISSION_REJECTED = Counter(
+    "moondream_admission_rejected",
+    "Requests shed by admission control, by reason",
+    ["reason"],
+)
+UPLOAD_BYTES = Counter(
+    "moondream_upload_bytes",
+    "Encoded image bytes uploaded to the Moondream cloud, by format",
+    ["route", "format"],
+)
+UPLOAD_BYTES_SAVED = Counter(
+    "moondream_upload_bytes_saved",
+    "Bytes by which cloud uploads undercut the encoded input images",
+    ["route"],
+)
+IMAGE_WIDTH = Histogram(
+    "moondream_image_width_pixels",
+    "Width of decoded input images",
+    ["route"],
+    buckets=_DIMENSION_BUCKETS,
+)
+IMAGE_HEIGHT = Histogram(
+    "moondream_image_height_pixels",
+    "Height of decoded input images",
+    ["route"],
+    buckets=_DIMENSION_BUCKETS,
+)
+
+
+def _route() -> str:
+    """
+    Path template of the matched route (``/v1/jobs/{job_id}``, not the raw
+    path) for the current request, or ``"none"``.
+    """
+    request = _request.get()
+    scope = None if request is None else request.scope
+    if scope is None or "route" not in scope:
+        return "none"
+    # FastAPI may hand over the route as declared, without its router
+    # prefix, so rebuild the template from the path and its parameters
+    names = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    return "/".join(
+        f"{{{names[part]}}}" if part in names else part
+        for part in scope["path"].split("/")
+    )
+
+
+@dataclass
+class Span:
+    """Bounds of one timed stage, in ``time.perf_counter_ns`` nanoseconds."""
+
+    start: int
+    end: int = 0
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+
+class _Request:
+    """
+    Bookkeeping of one HTTP request: its scope, the stage spans run on its
+    behalf (including in tasks and worker threads it started) and the kinds
+    of backend that answered it.
+    """
+
+    def __init__(self, scope: Scope) -> None:
+        # The route is read from the scope lazily because the router only
+        # records its match after the middleware has run
+        self.scope = scope
+        self.start = time.perf_counter_ns()
+        self.backends: set[str] = set()
+        self._spans: list[tuple[str, Span]] = []
+        self._finished = False
+        # Spans may finish on worker threads
+        self._lock = threading.Lock()
+
+    def add(self, name: str, span: Span) -> bool:
+        """Keep a finished span for ``finish``; ``False`` once it has run."""
+        with self._lock:
+            if self._finished:
+                return False
+            self._spans.append((name, span))
+            return True
+
+    def finish(self) -> list[tuple[str, Span]]:
+        """The spans finished so far; later ones are no longer kept."""
+        with self._lock:
+            self._finished = True
+            return self._spans
+
+    def backend(self) -> str:
+        if not self.backends:
+            return "none"
+        return next(iter(self.backends)) if len(self.backends) == 1 else "mixed"
+
+
+_request: ContextVar[_Request | None] = ContextVar("metrics_request", default=None)
+# Kind of backend running the current call, for stages outside any request
+_backend: ContextVar[str] = ContextVar("metrics_backend", default="none")
+
+
+def _exclusive(spans: list[tuple[str, Span]], start: int, end: int) -> dict[str, int]:
+    """
+    Split ``start``..``end`` between the stages of ``spans``: each instant
+    goes to the most recently started stage still running (the innermost one,
+    for nested stages), and time outside every stage to ``"other"``.
+    """
+    events = sorted(
+        (min(max(point, start), end), starting, index)
+        for index, (_, span) in enumerate(spans)
+        for point, starting in ((span.start, True), (span.end, False))
+    )
+    totals: dict[str, int] = {}
+    running: list[tuple[int, int, int]] = []
+    ended: set[int] = set()
+    previous = start
+    for point, starting, index in [*events, (end, False, -1)]:
+        while running and running[0][2] in ended:
+            heapq.heappop(running)
+        name = spans[running[0][2]][0] if running else "other"
+        totals[name] = totals.get(name, 0) + point - previous
+        previous = point
+        if index < 0:
+            continue
+        if starting:
+            span = spans[index][1]
+            # Nested stages starting on the same tick: the shorter is inner
+            heapq.heappush(running, (-span.start, span.end, index))
+        else:
+            ended.add(index)
+    return totals
+
+
+def _already_counted(error: BaseException | None) -> bool:
+    """Whether ``error``, or an error it was raised from, was counted already."""
+    seen: set[int] = set()
+    while error is not None and id(error) not in seen:
+        if getattr(error, "_metrics_counted", False):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Span]:
+    """
+    Time one stage of the current request and count the errors it raises.
+
+    This is the single instrumentation hook shared by every route; the
+    request comes from ``MetricsMiddleware`` via a context variable, which
+    ``run_blocking`` carries over to worker threads. Spans of a request are
+    observed when it completes (see ``MetricsMiddleware``); stages run outside
+    any request are observed as they finish. The yielded ``Span`` is the
+    measurement itself, for responses that also report durations.
+    """
+    request = _request.get()
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    span = Span(time.perf_counter_ns())
+    try:
+        yield span
+    except Exception as e:
+        # Enclosing stages (and wrappers raising from it) see the same error
+        if not _already_counted(e):
+            ERRORS.labels(_route(), name, type(e).__name__).inc()
+            try:
+                e._metrics_counted = True  # type: ignore[attr-defined]
+            except AttributeError:
+                pass
+        raise
+    finally:
+        span.end = time.perf_counter_ns()
+        in_flight.dec()
+        if request is None or not request.add(name, span):
+            STAGE_DURATION.labels(_route(), _backend.get(), name).observe(
+                span.duration / 1e9
+            )
+
+
+@contextmanager
+def serving(backend: str) -> Iterator[None]:
+    """Attribute stages outside any request to ``backend`` (local or cloud)."""
+    token = _backend.set(backend)
+    try:
+        yield
+    finally:
+        _backend.reset(token)
+
+
+def served_by(backend: str) -> None:
+    """Record that ``backend`` (local or cloud) answered the current request."""
+    request = _request.get()
+    if request is not None:
+        request.backends.add(backend)
+
+
+def latest() -> bytes:
+    """Exposition text, merged across server processes in multi-worker mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def release_process_metrics() -> None:
+    """Drop this process's live gauges from the shared multi-worker metrics."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def record_image(num_bytes: int, kind: str, size: tuple[int, int]) -> None:
+    """Record the encoded size and decoded dimensions of an input image."""
+    route = _route()
+    BYTES_INGESTED.labels(route, kind).inc(num_bytes)
+    IMAGE_WIDTH.labels(route).observe(size[0])
+    IMAGE_HEIGHT.labels(route).observe(size[1])
+
+
+def record_upload(num_bytes: int, source_bytes: int | None, fmt: str) -> None:
+    """Record a cloud upload and what it saved against the input's encoding."""
+    route = _route()
+    UPLOAD_BYTES.labels(route, fmt).inc(num_bytes)
+    if source_bytes is not None and source_bytes > num_bytes:
+        UPLOAD_BYTES_SAVED.labels(route).inc(source_bytes - num_bytes)
+
+
+class MetricsMiddleware:
+    """
+    Expose the request to ``stage`` and track in-flight and completed
+    requests. Runs for the whole response, including streamed bodies, and
+    observes the request's stage durations once it is done.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        request = _Request(scope)
+        token = _request.set(request)
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            # Stages still running (e.g. a shared load another request awaits)
+            # are observed when they finish instead
+            spans = request.finish()
+            route = _route()
+            REQUESTS.labels(route, status).inc()
+            durations = _exclusive(spans, request.start, time.perf_counter_ns())
+            backend = request.backend()
+            for name, duration in durations.items():
+                if duration > 0:
+                    STAGE_DURATION.labels(route, backend, name).observe(duration / 1e9)
+            _request.reset(token)
@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+from PIL import Image
+
+_HASH_SIZE = 8  # 8x8 difference grid -> 64-bit hash
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    Compute a 64-bit difference hash of an image.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit records
+    whether a pixel is brighter than its right-hand neighbour, which is
+    stable under JPEG noise and small overlays such as camera timestamps.
+    """
+    thumb = image.convert("L").resize(
+        (_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.BILINEAR
+    )
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+@dataclass
+class _SourceFrames:
+    hashes: list[int] = field(default_factory=list)
+    prompts: list[str] = field(default_factory=list)
+    answers: list[str] = field(default_factory=list)
+    expires: list[float] = field(default_factory=list)
+
+
+class NearDuplicateCache:
+    """
+    Per-source cache of recent answers matched by perceptual-hash distance.
+
+    Each source (camera URL or id) keeps its last few analysed frames. A new
+    frame reuses a previous answer for the same prompt when its ``dhash`` is
+    within ``max_distance`` bits of that frame's hash.
+    """
+
+    def __init__(
+        self,
+        max_distance: int,
+        ttl: float,
+        frames_per_source: int = 8,
+        max_sources: int = 256,
+    ) -> None:
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.frames_per_source = frames_per_source
+        self.max_sources = max_sources
+        self._sources: OrderedDict[str, _SourceFrames] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def _prune(self, frames: _SourceFrames, now: float) -> None:
+        keep = [i for i, expires in enumerate(frames.expires) if expires > now]
+        if len(keep) != len(frames.expires):
+            frames.hashes = [frames.hashes[i] for i in keep]
+            frames.prompts = [frames.prompts[i] for i in keep]
+            frames.answers = [frames.answers[i] for i in keep]
+            frames.expires = [frames.expires[i] for i in keep]
+
+    def lookup(self, source: str, prompt: str, image_hash: int) -> str | None:
+        """Return the answer of the closest recent frame for ``prompt``, if any."""
+        self.lookups += 1
+        frames = self._sources.get(source)
+        if frames is None:
+            return None
+        self._prune(frames, time.time())
+        candidates = [i for i, p in enumerate(frames.prompts) if p == prompt]
+        if not candidates:
+            return None
+        hashes = np.array([frames.hashes[i] for i in candidates], dtype=np.uint64)
+        distances = np.bitwise_count(hashes ^ np.uint64(image_hash))
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        self.hits += 1
+        self._sources.move_to_end(source)
+        return frames.answers[candidates[best]]
+
+    def store(self, source: str, prompt: str, image_hash: int, answer: str) -> None:
+        """Remember the answer for a frame, dropping the oldest beyond the limit."""
+        frames = self._sources.get(source)
+        if frames is None:
+            frames = self._sources[source] = _SourceFrames()
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        self._sources.move_to_end(source)
+        frames.hashes.append(image_hash)
+        frames.prompts.append(prompt)
+        frames.answers.append(answer)
+        frames.expires.append(time.time() + self.ttl)
+        if len(frames.hashes) > self.frames_per_source:
+            del frames.hashes[0], frames.prompts[0]
+            del frames.answers[0], frames.expires[0]
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "sources": len(self._sources),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
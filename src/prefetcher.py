@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+import httpx
+
+from vision_service import VisionService, decode_image_async, fetch_image_bytes
+
+# Seconds between attempts of a standby worker to take over prefetching
+_TAKEOVER_INTERVAL = 5.0
+
+
+@dataclass
+class WatchEntry:
+    """One snapshot URL analysed with one prompt every ``interval`` seconds."""
+
+    url: str
+    prompt: str
+    interval: float
+    freshness: float
+    answer: str | None = None
+    checked_at: float = 0.0  # monotonic time the answer was last confirmed
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+    analyses: int = 0
+    unchanged: int = 0
+    errors: int = 0
+
+    def fresh_answer(self) -> str | None:
+        if self.answer is None:
+            return None
+        if time.monotonic() - self.checked_at > self.freshness:
+            return None
+        return self.answer
+
+    def stats(self) -> dict[str, Any]:
+        age = time.monotonic() - self.checked_at if self.checked_at else None
+        return {
+            "url": self.url,
+            "prompt": self.prompt,
+            "interval": self.interval,
+            "fresh": self.fresh_answer() is not None,
+            "age_s": round(age, 1) if age is not None else None,
+            "analyses": self.analyses,
+            "unchanged": self.unchanged,
+            "errors": self.errors,
+        }
+
+
+def parse_watchlist(raw: str) -> list[WatchEntry]:
+    """
+    Parse ``PREFETCH_WATCHLIST``: a JSON array, or the path of a file holding
+    one, of ``{"url", "prompt", "interval"?, "freshness"?}`` objects.
+
+    ``interval`` defaults to 30 seconds and ``freshness`` to twice the
+    interval, so one slow or failed refresh does not drop the answer.
+    """
+    raw = raw.strip()
+    if not raw:
+        return []
+    if not raw.startswith("["):
+        raw = Path(raw).read_text()
+    entries = []
+    for item in json.loads(raw):
+        interval = float(item.get("interval", 30))
+        if interval <= 0:
+            raise ValueError(f"prefetch interval must be positive: {item}")
+        entries.append(
+            WatchEntry(
+                url=item["url"],
+                prompt=item["prompt"],
+                interval=interval,
+                freshness=float(item.get("freshness", 2 * interval)),
+            )
+        )
+    return entries
+
+
+def default_lock_path(watchlist: str, port: int) -> str:
+    """
+    Lock file shared by the worker processes of one server: keyed by its
+    watchlist and port, in the system temporary directory.
+    """
+    digest = hashlib.blake2b(f"{port}\0{watchlist}".encode(), digest_size=8)
+    return str(
+        Path(tempfile.gettempdir()) / f"moondream-prefetch-{digest.hexdigest()}.lock"
+    )
+
+
+class Prefetcher:
+    """
+    Keep answers for watched camera snapshots warm in the background.
+
+    Each entry is polled every ``interval`` seconds with a conditional GET
+    (``If-None-Match`` / ``If-Modified-Since``). A ``304``, or a body whose
+    hash matches the last analysed frame, only refreshes the answer's
+    freshness; a changed frame is decoded and analysed through the vision
+    service (and so its caches and inference budget). Requests for a watched
+    URL and prompt are answered from the latest result while it is fresh.
+
+    With ``lock_path``, only the worker process holding an exclusive lock on
+    that file polls; the others stand by and take over if it exits. Their
+    requests still reach the leader's analyses through a shared response
+    cache (``RESPONSE_CACHE_PATH``).
+    """
+
+    def __init__(
+        self,
+        service: VisionService,
+        http_client: httpx.AsyncClient,
+        entries: list[WatchEntry],
+        lock_path: str | None = None,
+    ) -> None:
+        self.service = service
+        self.http_client = http_client
+        self.entries = {(entry.url, entry.prompt): entry for entry in entries}
+        self.lock_path = lock_path
+        self.leader = False
+        self.hits = 0
+        self._lock_file: IO[str] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        if self._acquire():
+            self._watch_all()
+        else:
+            self._tasks.append(asyncio.create_task(self._stand_by()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the lock
+            self._lock_file = None
+        self.leader = False
+
+    def _acquire(self) -> bool:
+        """Take the prefetch lock without blocking; ``True`` once held."""
+        if self.lock_path is not None:
+            lock_file = open(self.lock_path, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        self.leader = True
+        return True
+
+    async def _stand_by(self) -> None:
+        while not self._acquire():
+            await asyncio.sleep(_TAKEOVER_INTERVAL)
+        self._watch_all()
+
+    def _watch_all(self) -> None:
+        for entry in self.entries.values():
+            self._tasks.append(asyncio.create_task(self._watch(entry)))
+
+    def lookup(self, url: str, prompt: str) -> str | None:
+        """The fresh prefetched answer for ``url`` and ``prompt``, if any."""
+        entry = self.entries.get((url, prompt))
+        answer = entry.fresh_answer() if entry is not None else None
+        if answer is not None:
+            self.hits += 1
+        return answer
+
+    async def _watch(self, entry: WatchEntry) -> None:
+        while True:
+            start = time.monotonic()
+            try:
+                await self.refresh(entry)
+            except Exception as e:
+                entry.errors += 1
+                print(f"Prefetch of {entry.url} failed: {e}")
+            await asyncio.sleep(max(0.0, entry.interval - (time.monotonic() - start)))
+
+    async def refresh(self, entry: WatchEntry) -> None:
+        """Fetch the snapshot once and re-analyse it if the frame changed."""
+        headers = {}
+        if entry.answer is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        data, response_headers = await fetch_image_bytes(
+            entry.url, self.http_client, headers
+        )
+        if data is not None:
+            content_hash = hashlib.blake2b(data, digest_size=20).hexdigest()
+            if content_hash != entry.content_hash or entry.answer is None:
+                image = await decode_image_async(data, "url")
+                entry.answer = await self.service.analyze_image_async(
+                    image, entry.prompt, source=entry.url
+                )
+                entry.content_hash = content_hash
+                entry.analyses += 1
+            else:
+                entry.unchanged += 1
+            entry.etag = response_headers.get("ETag")
+            entry.last_modified = response_headers.get("Last-Modified")
+        else:
+            entry.unchanged += 1
+        entry.checked_at = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "leader": self.leader,
+            "hits": self.hits,
+            "entries": [entry.stats() for entry in self.entries.values()],
+        }
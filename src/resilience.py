@@ -0,0 +1,165 @@
+import asyncio
+import random
+import time
+import urllib.error
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import settings
+from exceptions import DeadlineExceeded
+from metrics import RETRIES, RETRY_GIVE_UPS
+
+# Network-level failures worth retrying (HTTP statuses are checked separately)
+_TRANSIENT_ERRORS = (
+    httpx.TransportError,
+    urllib.error.URLError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# Monotonic time by which the current request must be answered, if any
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current request's deadline (``None``: no limit)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def limit_deadline(seconds: float | None) -> None:
+    """Tighten the current request's deadline to at most ``seconds`` from now."""
+    if not seconds or seconds <= 0:
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    _deadline.set(deadline if current is None else min(current, deadline))
+
+
+@contextmanager
+def deadline_lifted() -> Iterator[None]:
+    """
+    Run the enclosed step without a deadline: for work shared by several
+    requests, where each request bounds only its own wait.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def own_wait(operation: str, share: float = 1.0) -> Iterator[float | None]:
+    """
+    Yield the seconds the current request may wait for work it shares with
+    others: ``share`` of its remaining budget (``None``: no limit). A
+    ``TimeoutError`` once that wait is used up becomes ``DeadlineExceeded``.
+    """
+    left = remaining()
+    timeout = None if left is None else max(0.0, left) * share
+    started = time.monotonic()
+    try:
+        yield timeout
+    except TimeoutError as e:
+        if timeout is None or time.monotonic() - started < timeout:
+            raise
+        RETRY_GIVE_UPS.labels(operation, "deadline").inc()
+        raise DeadlineExceeded(f"Request deadline exceeded during {operation}") from e
+
+
+def is_transient(error: BaseException | None) -> bool:
+    """
+    Whether ``error``, or an error it wraps, is a transient failure of an
+    idempotent call: a timeout, a connection problem, HTTP 429 or a 5xx.
+    """
+    seen: set[int] = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code == 429 or error.code >= 500
+        if isinstance(error, _TRANSIENT_ERRORS):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+async def with_retries[T](operation: str, attempt: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run ``attempt`` within the request deadline, retrying transient failures
+    with full-jitter exponential backoff.
+
+    A retry is only started when its backoff plus the duration of the
+    previous attempt still fits in the remaining budget; otherwise the last
+    error is raised. Retries and give-ups are counted per ``operation``.
+    """
+    attempts = 0
+    while True:
+        attempts += 1
+        left = remaining()
+        if left is not None and left <= 0:
+            RETRY_GIVE_UPS.labels(operation, "deadline").inc()
+            raise DeadlineExceeded(f"Request deadline exceeded before {operation}")
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(left):
+                return await attempt()
+        except Exception as e:
+            left = remaining()
+            if left is not None and left <= 0:
+                RETRY_GIVE_UPS.labels(operation, "deadline").inc()
+                raise DeadlineExceeded(
+                    f"Request deadline exceeded during {operation}"
+                ) from e
+            if not is_transient(e):
+                raise
+            if attempts >= settings.RETRY_MAX_ATTEMPTS:
+                RETRY_GIVE_UPS.labels(operation, "attempts").inc()
+                raise
+            backoff = min(
+                settings.RETRY_MAX_DELAY_MS,
+                settings.RETRY_BASE_DELAY_MS * 2 ** (attempts - 1),
+            )
+            delay = random.uniform(0, backoff) / 1000
+            if left is not None and delay + time.monotonic() - started > left:
+                RETRY_GIVE_UPS.labels(operation, "deadline").inc()
+                raise
+            RETRIES.labels(operation).inc()
+            await asyncio.sleep(delay)
+
+
+class DeadlineMiddleware:
+    """
+    Start each request's end-to-end deadline from the ``X-Request-Timeout``
+    header (seconds) or ``REQUEST_DEADLINE``. Handlers may tighten it further
+    with ``limit_deadline``.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = settings.REQUEST_DEADLINE
+        for key, value in scope["headers"]:
+            if key == b"x-request-timeout":
+                try:
+                    seconds = float(value)
+                except ValueError:
+                    pass
+                break
+        deadline = time.monotonic() + seconds if seconds > 0 else None
+        token = _deadline.set(deadline)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
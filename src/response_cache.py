@@ -0,0 +1,199 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from PIL import Image
+
+from executor import run_blocking
+from single_flight import SingleFlight
+
+# Rough per-entry bookkeeping cost (OrderedDict node, tuple, float, str headers)
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def image_digest(image: Image.Image) -> str:
+    """Content hash of an image's decoded pixels (mode and size included)."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def make_cache_key(image_hash: str, prompt: str, model: str) -> str:
+    """Combine an ``image_digest``, prompt and model into a response cache key."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image_hash}\0{prompt}\0{model}".encode())
+    return digest.hexdigest()
+
+
+class SqliteResponseStore:
+    """On-disk response store so cached answers survive restarts."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+            )
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses "
+                "WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    In-process LRU/TTL cache of model answers keyed by ``make_cache_key``.
+
+    Eviction is bounded by the approximate memory held by keys and answers.
+    Concurrent lookups for a key that is already being computed share one
+    inference (see ``SingleFlight``). An optional
+    ``SqliteResponseStore`` backs the memory layer so entries survive
+    restarts.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        store: SqliteResponseStore | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._store = store
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._size_bytes = 0
+        self._inflight: SingleFlight[str] = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        return len(key) + len(value) + _ENTRY_OVERHEAD_BYTES
+
+    def _pop(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size_bytes -= self._entry_size(key, value)
+
+    def get(self, key: str) -> str | None:
+        """Return a fresh in-memory answer for ``key``, if any."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, expires_at: float | None = None) -> None:
+        """Store an answer in memory, evicting least-recently-used entries."""
+        if key in self._entries:
+            self._pop(key)
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, expires_at or time.time() + self.ttl)
+        self._size_bytes += size
+        while self._size_bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def _lookup(self, key: str) -> str | None:
+        value = self.get(key)
+        if value is None and self._store is not None:
+            stored = await run_blocking(self._store.get, key)
+            if stored is not None:
+                value, expires_at = stored
+                self.set(key, value, expires_at)
+        return value
+
+    async def lookup(self, key: str) -> str | None:
+        """Return a cached answer (memory, then disk), counting the hit or miss."""
+        value = await self._lookup(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def put(self, key: str, value: str) -> None:
+        """Store a freshly computed answer in memory and, if configured, on disk."""
+        expires_at = time.time() + self.ttl
+        self.set(key, value, expires_at)
+        if self._store is not None:
+            await run_blocking(self._store.set, key, value, expires_at)
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        value = await compute()
+        await self.put(key, value)
+        return value
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[str]],
+        timeout: float | None = None,
+    ) -> str:
+        """
+        Return the cached answer for ``key`` or compute it exactly once,
+        waiting at most ``timeout`` seconds for it (see ``SingleFlight.do``).
+        """
+        value = await self._lookup(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if key in self._inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return await self._inflight.do(
+            key, lambda: self._compute(key, compute), timeout
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
@@ -0,0 +1,17 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from metrics import stage
+
+
+class InstrumentedJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson, whose serialization time is recorded
+    as a metrics stage.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
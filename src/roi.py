@@ -0,0 +1,118 @@
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+# (x_min, y_min, x_max, y_max), as fractions of the frame or in pixels
+Box = tuple[float, float, float, float]
+
+# Edge of the square grayscale thumbnails motion is computed on
+_MOTION_SIZE = 128
+# Motion is located on a grid of _MOTION_SIZE / _MOTION_CELL cells per side
+_MOTION_CELL = 8
+# Per-pixel change (0-1) treated as noise rather than motion
+_PIXEL_NOISE = 0.08
+# Share of a cell's pixels that must change for the cell to count as moving
+_CELL_MOTION = 0.2
+
+
+def motion_thumbnail(image: Image.Image) -> np.ndarray:
+    """Square grayscale thumbnail of a frame as 0-1 floats, for ``motion_box``."""
+    thumb = image.convert("L").resize(
+        (_MOTION_SIZE, _MOTION_SIZE), Image.Resampling.BOX
+    )
+    return np.asarray(thumb, dtype=np.float32) / 255
+
+
+def motion_box(frame: np.ndarray, reference: np.ndarray) -> Box | None:
+    """
+    Normalised bounding box of what moved between two ``motion_thumbnail``
+    outputs, or ``None`` for a static scene.
+
+    Pixels that changed by more than ``_PIXEL_NOISE`` are counted per grid
+    cell; cells where enough of them changed are moving, and the box covers
+    every moving cell. Counting per cell drops isolated specks of noise.
+    """
+    changed = np.abs(frame - reference) > _PIXEL_NOISE
+    cells = _MOTION_SIZE // _MOTION_CELL
+    share = changed.reshape(cells, _MOTION_CELL, cells, _MOTION_CELL).mean(axis=(1, 3))
+    moving = share >= _CELL_MOTION
+    if not moving.any():
+        return None
+    rows = np.flatnonzero(moving.any(axis=1))
+    columns = np.flatnonzero(moving.any(axis=0))
+    return (
+        columns[0] / cells,
+        rows[0] / cells,
+        (columns[-1] + 1) / cells,
+        (rows[-1] + 1) / cells,
+    )
+
+
+@dataclass(frozen=True)
+class RegionOfInterest:
+    """
+    Where to look in a frame: boxes supplied with the request, and/or the
+    thumbnail of a reference frame to locate motion against.
+    """
+
+    boxes: tuple[Box, ...]
+    reference: np.ndarray | None
+    key: str  # identifies the region among loads of the same source
+
+    @classmethod
+    def create(
+        cls, boxes: list[Box], reference: np.ndarray | None, reference_key: str = ""
+    ) -> "RegionOfInterest":
+        digest = hashlib.blake2b(
+            repr((boxes, reference_key)).encode(), digest_size=12
+        ).hexdigest()
+        return cls(tuple(boxes), reference, digest)
+
+    def crop_box(
+        self,
+        size: tuple[int, int],
+        preview: Image.Image | None,
+        padding: float,
+        min_size: int,
+    ) -> tuple[int, int, int, int] | None:
+        """
+        Pixel box to crop a frame of ``size`` to, or ``None`` to keep it whole.
+
+        The request boxes and the motion found in ``preview`` (any downscaled
+        copy of the frame) are merged into one box, grown by ``padding`` of
+        its size on each side and to at least ``min_size`` pixels per edge,
+        then clipped to the frame. Boxes with any coordinate above 1 are read
+        as pixels, the others as fractions of the frame.
+        """
+        width, height = size
+        boxes = [
+            box if max(box) > 1 else (*_scale(box[:2], size), *_scale(box[2:], size))
+            for box in self.boxes
+        ]
+        if self.reference is not None and preview is not None:
+            moved = motion_box(motion_thumbnail(preview), self.reference)
+            if moved is not None:
+                boxes.append((*_scale(moved[:2], size), *_scale(moved[2:], size)))
+        if not boxes:
+            return None
+        x_min = min(box[0] for box in boxes)
+        y_min = min(box[1] for box in boxes)
+        x_max = max(box[2] for box in boxes)
+        y_max = max(box[3] for box in boxes)
+        pad_x = max(padding * (x_max - x_min), (min_size - (x_max - x_min)) / 2)
+        pad_y = max(padding * (y_max - y_min), (min_size - (y_max - y_min)) / 2)
+        box = (
+            max(0, int(x_min - pad_x)),
+            max(0, int(y_min - pad_y)),
+            min(width, int(np.ceil(x_max + pad_x))),
+            min(height, int(np.ceil(y_max + pad_y))),
+        )
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return None
+        return box
+
+
+def _scale(point: tuple[float, float], size: tuple[int, int]) -> tuple[float, float]:
+    return point[0] * size[0], point[1] * size[1]
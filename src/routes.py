@@ -1,90 +1,344 @@
-import json
+import asyncio
 import time
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Coroutine, Iterable, Iterator
+from contextlib import aclosing, contextmanager
 from datetime import datetime, timezone
+from typing import Any
 
-from fastapi import APIRouter, HTTPException, Request
+import httpx
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
+from PIL import Image
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from config import settings
-from exceptions import VisionServiceError
+from exceptions import DeadlineExceeded, VisionServiceError
+from generation import (
+    NO_LIMITS,
+    GenerationLimits,
+    estimate_tokens,
+    generation_limits,
+)
+from jobs import JobQueue, ManifestError
+from keyframes import Clip, format_timeline
+from metrics import Span, latest, stage
 from ollama_model_mocks import MOCK_MOONDREAM_MODEL_DATA
+from prefetcher import Prefetcher
+from resilience import limit_deadline
+from roi import RegionOfInterest
 from schemas import (
+    BoundingBox,
+    CaptionRequest,
+    CaptionResponse,
+    CaptionResult,
     ChatChoice,
     ChatCompletionRequest,
     ChatCompletionResponse,
     ChatMessage,
+    DetectRequest,
+    DetectResponse,
+    DetectResult,
+    ImagePoint,
+    JobStatusResponse,
     OllamaChatRequest,
     OllamaChatResponse,
+    OllamaGenerateOptions,
     OllamaGenerateRequest,
     OllamaGenerateResponse,
     OllamaMessage,
     OllamaModelShowResponse,
     OllamaShowModelRequest,
+    PointResponse,
+    PointResult,
+    RegionOfInterestOptions,
+    SegmentResponse,
+    SegmentResult,
+    SkillRequest,
+    TimelineEntry,
+    VisionQueryAnswer,
+    VisionQueryRequest,
+    VisionQueryResponse,
+)
+from vision_service import (
+    VisionService,
+    load_image_async,
+    load_media_async,
+    load_region_async,
 )
-from vision_service import VisionService, load_image
 
 # ── OpenAI SSE streaming helpers ──────────────────────────────────────────
 
 
-def _make_streaming_chunk(
-    chunk_id: str,
-    created: int,
-    model: str,
-    *,
-    delta_content: str | None = None,
-    finish_reason: str | None = None,
-) -> str:
-    """Build an SSE ``data:`` line matching the OpenAI chat completion chunk format."""
-    delta: dict[str, str] = {}
-    if delta_content is not None:
-        delta["content"] = delta_content
-    choice = {
-        "index": 0,
-        "delta": delta,
-        "logprobs": None,
-        "finish_reason": finish_reason,
-    }
-    payload = {
-        "id": chunk_id,
-        "object": "chat.completion.chunk",
-        "created": created,
-        "model": model,
-        "system_fingerprint": None,
-        "choices": [choice],
-    }
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+class _ChunkTemplate:
+    """
+    OpenAI chat completion chunk frames for one stream.
+
+    Everything but the delta is the same for every frame of a stream, so it
+    is encoded once; each frame only encodes its content string.
+    """
+
+    def __init__(self, chunk_id: str, created: int, model: str) -> None:
+        self._prefix = (
+            b'data: {"id":'
+            + orjson.dumps(chunk_id)
+            + b',"object":"chat.completion.chunk","created":'
+            + orjson.dumps(created)
+            + b',"model":'
+            + orjson.dumps(model)
+            + b',"system_fingerprint":null,"choices":[{"index":0,"delta":'
+        )
+
+    def delta(self, content: str) -> bytes:
+        return b"".join(
+            (
+                self._prefix,
+                b'{"content":',
+                orjson.dumps(content),
+                b'},"logprobs":null,"finish_reason":null}]}\n\n',
+            )
+        )
+
+    def finish(self, reason: str) -> bytes:
+        return b"".join(
+            (
+                self._prefix,
+                b'{},"logprobs":null,"finish_reason":',
+                orjson.dumps(reason),
+                b"}]}\n\n",
+            )
+        )
+
+
+def _answer_stream(
+    vs: VisionService,
+    media: Image.Image | Clip,
+    prompt: str,
+    source: str | None,
+    near_duplicates: bool,
+    limits: GenerationLimits,
+) -> AsyncGenerator[str, None]:
+    """Answer deltas for one image, or the timeline lines of a clip."""
+    if isinstance(media, Clip):
+        return vs.stream_timeline(media, prompt, limits)
+    return vs.stream_image_analysis(
+        media, prompt, source=source, near_duplicates=near_duplicates, limits=limits
+    )
 
 
 async def _openai_stream_generator(
     vs: VisionService,
-    image_url: str,
+    image: Image.Image | Clip,
     prompt: str,
     model: str,
-) -> AsyncGenerator[str, None]:
+    source: str | None = None,
+    near_duplicates: bool = True,
+    limits: GenerationLimits = NO_LIMITS,
+) -> AsyncGenerator[bytes, None]:
     """Yield SSE ``data:`` lines for an OpenAI streaming response."""
-    chunk_id = f"chatcmpl-{int(time.time())}"
     created = int(time.time())
-
-    image = load_image(image_url)
-    # Run inference; we don't have per-token streaming from the local model,
-    # so we yield the full answer as a single delta.
-    answer = vs.analyze_image(image, prompt)
+    chunks = _ChunkTemplate(f"chatcmpl-{created}", created, model)
 
     # Role announcement
-    yield _make_streaming_chunk(chunk_id, created, model, delta_content="")
+    yield chunks.delta("")
 
-    # Content delta (entire answer)
-    yield _make_streaming_chunk(chunk_id, created, model, delta_content=answer)
+    # Content deltas, forwarded as the model generates them
+    async with aclosing(
+        _answer_stream(vs, image, prompt, source, near_duplicates, limits)
+    ) as deltas:
+        async for delta in deltas:
+            yield chunks.delta(delta)
 
     # Final chunk with finish_reason
-    yield _make_streaming_chunk(chunk_id, created, model, finish_reason="stop")
+    yield chunks.finish("stop")
 
-    yield "data: [DONE]\n\n"
+    yield b"data: [DONE]\n\n"
 
 
+# ── Ollama NDJSON streaming helpers ───────────────────────────────────────
+
+
+class _NDJSONTemplate:
+    """
+    Ollama streaming (NDJSON) frames for one stream.
+
+    The model name and the frame layout are encoded once; each frame only
+    encodes its timestamp, content and, for the final frame, the stats.
+    """
+
+    def __init__(self, model: str, *, chat: bool) -> None:
+        self._prefix = b'{"model":' + orjson.dumps(model) + b',"created_at":'
+        self._content = (
+            b',"message":{"role":"assistant","content":' if chat else b',"response":'
+        )
+        self._content_end = b"}" if chat else b""
+
+    def frame(self, content: str, stats: dict[str, object] | None = None) -> bytes:
+        """Encode one frame; ``stats`` (final frame only) are merged into it."""
+        if stats is None:
+            tail = b',"done":false}\n'
+        else:
+            tail = b"," + orjson.dumps(stats)[1:] + b"\n"
+        return b"".join(
+            (
+                self._prefix,
+                orjson.dumps(datetime.now(timezone.utc).isoformat()),
+                self._content,
+                orjson.dumps(content),
+                self._content_end,
+                tail,
+            )
+        )
+
+
+class _Durations:
+    """
+    Durations a response reports, in nanoseconds since the request started.
+
+    Steps are timed with ``metrics.stage``, so Ollama's ``*_duration`` fields
+    and the stage histograms come from the same spans; only the histograms
+    split nested spans (``fetch`` inside ``load``) between their stages.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter_ns()
+        self.spans: dict[str, list[Span]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Span]:
+        with stage(name) as span:
+            self.spans.setdefault(name, []).append(span)
+            yield span
+
+    def busy(self, name: str) -> int:
+        """Wall-clock time covered by the finished, possibly overlapping spans."""
+        total = 0
+        covered_until = 0
+        spans = sorted(
+            (span.start, span.end) for span in self.spans.get(name, ()) if span.end
+        )
+        for start, end in spans:
+            if end <= covered_until:
+                continue
+            total += end - max(start, covered_until)
+            covered_until = end
+        return total
+
+    def total(self) -> int:
+        return time.perf_counter_ns() - self.start
+
+
+async def _in_order(
+    streams: list[AsyncGenerator[str, None]], limit: int
+) -> AsyncGenerator[tuple[int, str], None]:
+    """
+    Run ``streams`` concurrently, at most ``limit`` at a time, and yield their
+    ``(index, chunk)`` pairs in stream order: a stream's chunks are held back
+    until every earlier stream has finished. Closing the generator cancels
+    the streams still running.
+    """
+    slots = asyncio.Semaphore(limit)
+    queues: list[asyncio.Queue[str | BaseException | None]] = [
+        asyncio.Queue() for _ in streams
+    ]
+
+    async def pump(stream: AsyncGenerator[str, None], queue: asyncio.Queue) -> None:
+        try:
+            async with slots, aclosing(stream) as chunks:
+                async for chunk in chunks:
+                    queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(None)
+
+    tasks = [
+        asyncio.ensure_future(pump(stream, queue))
+        for stream, queue in zip(streams, queues)
+    ]
+    try:
+        for index, queue in enumerate(queues):
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield index, chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _ollama_stream_generator(
+    vs: VisionService,
+    images: list[tuple[Image.Image | Clip, str | None]],
+    prompt: str,
+    model: str,
+    *,
+    chat: bool,
+    durations: _Durations,
+    near_duplicates: bool = True,
+    limits: GenerationLimits = NO_LIMITS,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Yield NDJSON frames in Ollama's streaming format.
+
+    ``/api/chat`` frames carry a ``message`` delta and ``/api/generate``
+    frames a ``response`` delta. Multiple images are analysed concurrently
+    (``GENERATE_MAX_FANOUT`` at a time) and streamed in order, separated by
+    ``" | "`` like the non-streaming response. The final frame has
+    ``done: true`` and the timing stats; ``eval_count`` estimates the tokens
+    of the answers actually sent.
+    """
+    frames = _NDJSONTemplate(model, chat=chat)
+    first_chunk_at: int | None = None
+    answers: list[list[str]] = [[] for _ in images]
+    streams = [
+        _answer_stream(vs, image, prompt, source, near_duplicates, limits)
+        for image, source in images
+    ]
+    with durations.stage("answer") as span:
+        async with aclosing(_in_order(streams, settings.GENERATE_MAX_FANOUT)) as chunks:
+            current = 0
+            async for index, chunk in chunks:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter_ns()
+                while current < index:
+                    current += 1
+                    yield frames.frame(" | ")
+                answers[index].append(chunk)
+                yield frames.frame(chunk)
+            # Images without a single chunk still get their separator
+            while current < len(images) - 1:
+                current += 1
+                yield frames.frame(" | ")
+    eval_count = sum(estimate_tokens("".join(answer)) for answer in answers)
+
+    first_chunk_at = first_chunk_at or span.end
+    stats: dict[str, object] = {
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": durations.total(),
+        "load_duration": durations.busy("load"),
+        "prompt_eval_count": estimate_tokens(prompt),
+        "prompt_eval_duration": first_chunk_at - span.start,
+        "eval_count": eval_count,
+        "eval_duration": span.end - first_chunk_at,
+    }
+    if not chat:
+        stats["context"] = []
+    yield frames.frame("", stats)
+
+
+# The model card never changes, so it is validated and encoded once
+_SHOW_MODEL_BODY = orjson.dumps(
+    OllamaModelShowResponse.model_validate(MOCK_MOONDREAM_MODEL_DATA).model_dump(
+        mode="json"
+    )
+)
+
 openai_router = APIRouter()
 ollama_router = APIRouter()
+vision_router = APIRouter()
+jobs_router = APIRouter()
 default_router = APIRouter()
 
 
@@ -132,6 +386,11 @@ def _extract_ollama_chat_content(
     return image_data, prompt
 
 
+def _error_status(error: VisionServiceError) -> int:
+    """HTTP status for a service error: 504 once the deadline ran out, else 500."""
+    return 504 if isinstance(error, DeadlineExceeded) else 500
+
+
 def _get_service(request: Request) -> VisionService:
     """Get the vision service instance from the app lifespan state."""
     vs = getattr(request.app.state, "vision_service", None)
@@ -140,6 +399,99 @@ def _get_service(request: Request) -> VisionService:
     return vs
 
 
+def _get_http_client(request: Request) -> httpx.AsyncClient | None:
+    """Get the shared HTTP client for image URL fetches, if the app has one."""
+    return getattr(request.app.state, "http_client", None)
+
+
+def _image_source_id(request: Request, image_source: str) -> str | None:
+    """Identify the camera an image came from, for near-duplicate matching.
+
+    An explicit ``X-Camera-Id`` header wins; otherwise the image URL is used.
+    Inline (base64) images without the header have no source.
+    """
+    camera_id = request.headers.get("X-Camera-Id")
+    if camera_id:
+        return camera_id
+    if image_source.startswith(("http://", "https://")):
+        return image_source
+    return None
+
+
+def _near_duplicates_allowed(request: Request) -> bool:
+    """``Cache-Control: no-cache`` opts a request out of near-duplicate reuse."""
+    return "no-cache" not in request.headers.get("Cache-Control", "").lower()
+
+
+def _timeline_entries(
+    timeline: list[dict[str, Any]] | None,
+) -> list[TimelineEntry] | None:
+    """Response timeline of a clip input, or ``None`` for still images."""
+    return [TimelineEntry(**entry) for entry in timeline] if timeline else None
+
+
+async def _region_of_interest(
+    request: Request, options: RegionOfInterestOptions | None
+) -> RegionOfInterest | None:
+    """The request's region of interest, loading its reference frame if any."""
+    if options is None:
+        return None
+    boxes = []
+    for box in options.boxes or []:
+        if min(box.x_min, box.y_min) < 0 or (
+            box.x_max <= box.x_min or box.y_max <= box.y_min
+        ):
+            raise HTTPException(
+                status_code=400, detail="Invalid region of interest box"
+            )
+        boxes.append((box.x_min, box.y_min, box.x_max, box.y_max))
+    return await load_region_async(boxes, options.reference, _get_http_client(request))
+
+
+def _openai_limits(body: ChatCompletionRequest) -> GenerationLimits:
+    """Generation limits of an OpenAI request; an unset temperature is not sent."""
+    temperature = body.temperature if "temperature" in body.model_fields_set else None
+    return generation_limits(body.max_tokens, temperature, body.stop)
+
+
+def _ollama_limits(
+    options: OllamaGenerateOptions | None,
+    max_tokens: int | None = None,
+    temperature: float | None = None,
+) -> GenerationLimits:
+    """
+    Generation limits of an Ollama request: ``num_predict``, ``temperature``
+    and ``stop`` from ``options``, over the top-level fields. Only options
+    the client actually set count, not the schema defaults.
+    """
+    chosen = options.model_dump(exclude_unset=True) if options is not None else {}
+    return generation_limits(
+        chosen.get("num_predict", max_tokens),
+        chosen.get("temperature", temperature),
+        chosen.get("stop"),
+    )
+
+
+def _prefetched_answer(
+    request: Request,
+    image_source: str,
+    prompt: str,
+    roi: RegionOfInterest | None = None,
+    limits: GenerationLimits = NO_LIMITS,
+) -> str | None:
+    """
+    Fresh answer of a watched snapshot (see ``Prefetcher``), unless
+    ``no-cache``. Prefetched answers are about the whole frame, with default
+    generation settings.
+    """
+    prefetcher: Prefetcher | None = getattr(request.app.state, "prefetcher", None)
+    if prefetcher is None or not _near_duplicates_allowed(request):
+        return None
+    if roi is not None or limits != NO_LIMITS:
+        return None
+    return prefetcher.lookup(image_source, prompt)
+
+
 @openai_router.post("/chat/completions")
 async def chat_completion(
     request: Request,
@@ -155,18 +507,44 @@ async def chat_completion(
         if not prompt:
             raise HTTPException(status_code=400, detail="No text prompt provided")
 
-        # ── Streaming path ──────────────────────────────────────────────
-        if body.stream:
-            return StreamingResponse(
-                _openai_stream_generator(
-                    vs, image_url, prompt, body.model or settings.MODEL_NAME
-                ),
-                media_type="text/event-stream",
-            )
+        roi = await _region_of_interest(request, body.roi)
+        limits = _openai_limits(body)
+        text_answer = (
+            None
+            if body.stream
+            else _prefetched_answer(request, image_url, prompt, roi, limits)
+        )
+        timeline = None
+        if text_answer is None:
+            image = await load_media_async(image_url, _get_http_client(request), roi)
 
-        # ── Non-streaming path ──────────────────────────────────────────
-        image = load_image(image_url)
-        text_answer = vs.analyze_image(image, prompt)
+            # ── Streaming path ──────────────────────────────────────────
+            if body.stream:
+                return StreamingResponse(
+                    _openai_stream_generator(
+                        vs,
+                        image,
+                        prompt,
+                        body.model or settings.MODEL_NAME,
+                        source=_image_source_id(request, image_url),
+                        near_duplicates=_near_duplicates_allowed(request),
+                        limits=limits,
+                    ),
+                    media_type="text/event-stream",
+                )
+
+            # ── Non-streaming path ──────────────────────────────────────
+            if isinstance(image, Clip):
+                timeline = await vs.analyze_clip(image, prompt, limits)
+                text_answer = format_timeline(timeline)
+            else:
+                text_answer = await vs.analyze_image_async(
+                    image,
+                    prompt,
+                    source=_image_source_id(request, image_url),
+                    near_duplicates=_near_duplicates_allowed(request),
+                    limits=limits,
+                )
         usage_stats = vs.calculate_token_cost(prompt, text_answer)
 
         return ChatCompletionResponse(
@@ -185,10 +563,11 @@ async def chat_completion(
                 "completion_tokens": usage_stats[1],
                 "total_tokens": sum(usage_stats),
             },
+            timeline=_timeline_entries(timeline),
         )
 
     except VisionServiceError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -198,6 +577,7 @@ async def chat_completion(
 @ollama_router.post("/api/chat", response_model=OllamaChatResponse)
 async def ollama_chat_completion(request: Request, body: OllamaChatRequest):
     try:
+        durations = _Durations()
         vs = _get_service(request)
         last_message = body.messages[-1]
         image_data, prompt = _extract_ollama_chat_content(last_message)
@@ -207,49 +587,159 @@ async def ollama_chat_completion(request: Request, body: OllamaChatRequest):
         if not prompt:
             raise HTTPException(status_code=400, detail="No text prompt provided")
 
-        image = load_image(image_data)
-        answer = vs.analyze_image(image, prompt)
+        if body.options is not None:
+            limit_deadline(body.options.timeout)
+        roi = await _region_of_interest(request, body.roi)
+        limits = _ollama_limits(body.options, body.max_tokens, body.temperature)
+        answer = (
+            None
+            if body.stream
+            else _prefetched_answer(request, image_data, prompt, roi, limits)
+        )
+        timeline = None
+        if answer is None:
+            with durations.stage("load"):
+                image = await load_media_async(
+                    image_data, _get_http_client(request), roi
+                )
+
+            if body.stream:
+                return StreamingResponse(
+                    _ollama_stream_generator(
+                        vs,
+                        [(image, _image_source_id(request, image_data))],
+                        prompt,
+                        body.model or settings.MODEL_NAME,
+                        chat=True,
+                        durations=durations,
+                        near_duplicates=_near_duplicates_allowed(request),
+                        limits=limits,
+                    ),
+                    media_type="application/x-ndjson",
+                )
+
+            with durations.stage("answer"):
+                if isinstance(image, Clip):
+                    timeline = await vs.analyze_clip(image, prompt, limits)
+                    answer = format_timeline(timeline)
+                else:
+                    answer = await vs.analyze_image_async(
+                        image,
+                        prompt,
+                        source=_image_source_id(request, image_data),
+                        near_duplicates=_near_duplicates_allowed(request),
+                        limits=limits,
+                    )
 
         return OllamaChatResponse(
             model=body.model or settings.MODEL_NAME,
             created_at=datetime.now(timezone.utc).isoformat(),
             message=OllamaMessage(role="assistant", content=answer),
             done=True,
+            timeline=_timeline_entries(timeline),
         )
 
     except VisionServiceError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _gather_ordered[T](coros: Iterable[Coroutine[Any, Any, T]]) -> list[T]:
+    """Run coroutines concurrently, returning results in order.
+
+    If one fails, the others are cancelled before the error propagates.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
 @ollama_router.post("/api/generate", response_model=OllamaGenerateResponse)
 async def generate(request: Request, body: OllamaGenerateRequest):
     try:
-        start_time = time.time_ns()
-        load_start = time.time_ns()
+        durations = _Durations()
 
         vs = _get_service(request)
         prompt = body.prompt
+        if body.options is not None:
+            limit_deadline(body.options.timeout)
 
         if not body.images:
             raise HTTPException(status_code=400, detail="No images provided")
 
-        images = []
-        for image_data in body.images:
-            images.append(load_image(image_data))
+        http_client = _get_http_client(request)
+        near_duplicates = _near_duplicates_allowed(request)
+        roi = await _region_of_interest(request, body.roi)
+        limits = _ollama_limits(body.options)
+        fanout = asyncio.Semaphore(settings.GENERATE_MAX_FANOUT)
+
+        async def load(image_data: str) -> Image.Image | Clip:
+            with durations.stage("load"):
+                return await load_media_async(image_data, http_client, roi)
+
+        # ── Streaming path: decode concurrently, stream answers in order ──
+        if body.stream:
+
+            async def load_bounded(image_data: str) -> Image.Image | Clip:
+                async with fanout:
+                    return await load(image_data)
+
+            images = await _gather_ordered(load_bounded(d) for d in body.images)
+            return StreamingResponse(
+                _ollama_stream_generator(
+                    vs,
+                    [
+                        (image, _image_source_id(request, image_data))
+                        for image, image_data in zip(images, body.images)
+                    ],
+                    prompt,
+                    body.model or settings.MODEL_NAME,
+                    chat=False,
+                    durations=durations,
+                    near_duplicates=near_duplicates,
+                    limits=limits,
+                ),
+                media_type="application/x-ndjson",
+            )
+
+        timeline: list[dict[str, Any]] = []
 
-        load_duration = time.time_ns() - load_start
+        async def process(index: int, image_data: str) -> str:
+            prefetched = _prefetched_answer(request, image_data, prompt, roi, limits)
+            if prefetched is not None:
+                return prefetched
+            async with fanout:
+                image = await load(image_data)
+                with durations.stage("answer"):
+                    if isinstance(image, Clip):
+                        entries = await vs.analyze_clip(image, prompt, limits)
+                        timeline.extend({**entry, "image": index} for entry in entries)
+                        return format_timeline(entries)
+                    return await vs.analyze_image_async(
+                        image,
+                        prompt,
+                        source=_image_source_id(request, image_data),
+                        near_duplicates=near_duplicates,
+                        limits=limits,
+                    )
 
-        inference_start = time.time_ns()
-        answers: list[str] = []
-        for img in images:
-            answers.append(vs.analyze_image(img, prompt))
+        # Images are decoded and analysed concurrently; answer order stays
+        # aligned with body.images.
+        answers = await _gather_ordered(
+            process(index, data) for index, data in enumerate(body.images)
+        )
+        timeline.sort(key=lambda entry: entry["image"])
 
-        inference_duration = time.time_ns() - inference_start
-        total_duration = time.time_ns() - start_time
+        load_duration = durations.busy("load")
+        inference_duration = durations.busy("answer")
+        total_duration = durations.total()
 
         # Join answers for all images so no inference is wasted
         combined_answer = " | ".join(answers)
@@ -262,14 +752,15 @@ async def generate(request: Request, body: OllamaGenerateRequest):
             context=[],
             total_duration=total_duration,
             load_duration=load_duration,
-            prompt_eval_count=len(prompt),
+            prompt_eval_count=estimate_tokens(prompt),
             prompt_eval_duration=inference_duration,
-            eval_count=len(combined_answer),
+            eval_count=sum(estimate_tokens(answer) for answer in answers),
             eval_duration=inference_duration,
+            timeline=_timeline_entries(timeline),
         )
 
     except VisionServiceError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -280,7 +771,284 @@ async def generate(request: Request, body: OllamaGenerateRequest):
 async def ollama_show_model(body: OllamaShowModelRequest):
     if body.model not in ("moondream", "moondream2"):
         raise HTTPException(status_code=404, detail=f"Model {body.model} not found")
-    return MOCK_MOONDREAM_MODEL_DATA
+    return Response(content=_SHOW_MODEL_BODY, media_type="application/json")
+
+
+@vision_router.post("/query", response_model=VisionQueryResponse)
+async def vision_query(request: Request, body: VisionQueryRequest):
+    """Answer several prompts about one image, encoding the image only once."""
+    try:
+        durations = _Durations()
+        vs = _get_service(request)
+
+        prompts = [prompt for prompt in body.prompts if prompt]
+        if not prompts:
+            raise HTTPException(status_code=400, detail="No text prompts provided")
+
+        image = await load_image_async(body.image, _get_http_client(request))
+        answers = await vs.answer_questions(image, prompts)
+
+        return VisionQueryResponse(
+            model=body.model or settings.MODEL_NAME,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            answers=[
+                VisionQueryAnswer(prompt=prompt, answer=answer)
+                for prompt, answer in zip(prompts, answers)
+            ],
+            total_duration=durations.total(),
+        )
+
+    except VisionServiceError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ── Structured skills (detect / point / segment / caption) ────────────────
+
+
+async def _prepare_images(
+    request: Request, vs: VisionService, sources: list[str]
+) -> list[tuple[Image.Image, str]]:
+    """Load, hash and encode a batch of images concurrently, in order."""
+    http_client = _get_http_client(request)
+    fanout = asyncio.Semaphore(settings.GENERATE_MAX_FANOUT)
+
+    async def prepare(source: str) -> tuple[Image.Image, str]:
+        async with fanout:
+            image = await load_image_async(source, http_client)
+            return image, await vs.prepare_image(image)
+
+    return await _gather_ordered(prepare(source) for source in sources)
+
+
+async def _run_object_skill(
+    request: Request, body: SkillRequest, skill: str, **kwargs: Any
+) -> list[tuple[int, str, dict[str, Any]]]:
+    """Run ``skill`` for every (image, object) pair of ``body`` concurrently.
+
+    Returns ``(image index, object, raw SDK result)`` in image-major order.
+    """
+    vs = _get_service(request)
+    objects = [obj for obj in body.objects if obj]
+    if not body.images:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if not objects:
+        raise HTTPException(status_code=400, detail="No objects provided")
+
+    prepared = await _prepare_images(request, vs, body.images)
+    pairs = [(index, obj) for index in range(len(prepared)) for obj in objects]
+    results = await _gather_ordered(
+        vs.run_skill(
+            skill,
+            prepared[index][0],
+            digest=prepared[index][1],
+            object=obj,
+            **kwargs,
+        )
+        for index, obj in pairs
+    )
+    return [(index, obj, result) for (index, obj), result in zip(pairs, results)]
+
+
+@vision_router.post("/detect", response_model=DetectResponse)
+async def vision_detect(request: Request, body: DetectRequest):
+    """Bounding boxes (normalised 0-1) for each object in each image."""
+    try:
+        durations = _Durations()
+        kwargs: dict[str, Any] = {}
+        if body.max_objects is not None:
+            kwargs["settings"] = {"max_objects": body.max_objects}
+
+        results = await _run_object_skill(request, body, "detect", **kwargs)
+
+        return DetectResponse(
+            model=body.model or settings.MODEL_NAME,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            results=[
+                DetectResult(
+                    image=index,
+                    object=obj,
+                    objects=[BoundingBox(**box) for box in result.get("objects", [])],
+                )
+                for index, obj, result in results
+            ],
+            total_duration=durations.total(),
+        )
+
+    except VisionServiceError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@vision_router.post("/point", response_model=PointResponse)
+async def vision_point(request: Request, body: SkillRequest):
+    """Centre points (normalised 0-1) for each object in each image."""
+    try:
+        durations = _Durations()
+        results = await _run_object_skill(request, body, "point")
+
+        return PointResponse(
+            model=body.model or settings.MODEL_NAME,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            results=[
+                PointResult(
+                    image=index,
+                    object=obj,
+                    points=[ImagePoint(**point) for point in result.get("points", [])],
+                )
+                for index, obj, result in results
+            ],
+            total_duration=durations.total(),
+        )
+
+    except VisionServiceError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@vision_router.post("/segment", response_model=SegmentResponse)
+async def vision_segment(request: Request, body: SkillRequest):
+    """SVG path and bounding box of each object in each image."""
+    try:
+        durations = _Durations()
+        results = await _run_object_skill(request, body, "segment")
+
+        return SegmentResponse(
+            model=body.model or settings.MODEL_NAME,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            results=[
+                SegmentResult(
+                    image=index,
+                    object=obj,
+                    path=result.get("path", ""),
+                    bbox=BoundingBox(**result["bbox"]) if result.get("bbox") else None,
+                )
+                for index, obj, result in results
+            ],
+            total_duration=durations.total(),
+        )
+
+    except VisionServiceError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@vision_router.post("/caption", response_model=CaptionResponse)
+async def vision_caption(request: Request, body: CaptionRequest):
+    """A caption of the requested length for each image."""
+    try:
+        durations = _Durations()
+        vs = _get_service(request)
+        if not body.images:
+            raise HTTPException(status_code=400, detail="No images provided")
+
+        prepared = await _prepare_images(request, vs, body.images)
+        results = await _gather_ordered(
+            vs.run_skill("caption", image, digest=digest, length=body.length)
+            for image, digest in prepared
+        )
+
+        return CaptionResponse(
+            model=body.model or settings.MODEL_NAME,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            results=[
+                CaptionResult(image=index, caption=str(result["caption"]).strip())
+                for index, result in enumerate(results)
+            ],
+            total_duration=durations.total(),
+        )
+
+    except VisionServiceError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ── Bulk jobs ─────────────────────────────────────────────────────────────
+
+
+def _get_jobs(request: Request) -> JobQueue:
+    """Get the bulk job queue, if jobs are enabled."""
+    jobs = getattr(request.app.state, "jobs", None)
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Bulk jobs are disabled")
+    return jobs
+
+
+async def _job_status(jobs: JobQueue, job_id: str) -> JobStatusResponse:
+    status = await jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JobStatusResponse(**status)
+
+
+@jobs_router.post("", status_code=202, response_model=JobStatusResponse)
+async def submit_job(request: Request, prompt: str | None = None):
+    """
+    Queue an NDJSON manifest of ``{"image": ..., "prompt": ...}`` lines as a
+    bulk job; ``prompt`` is the default for lines without one.
+    """
+    try:
+        jobs = _get_jobs(request)
+        job_id = await jobs.submit(request.stream(), prompt)
+        return await _job_status(jobs, job_id)
+
+    except ManifestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except VisionServiceError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@jobs_router.get("/{job_id}", response_model=JobStatusResponse)
+async def job_status(request: Request, job_id: str):
+    """Progress counters of a bulk job."""
+    return await _job_status(_get_jobs(request), job_id)
+
+
+@jobs_router.get("/{job_id}/results")
+async def job_results(
+    request: Request, job_id: str, after: int = 0, wait: bool = True
+) -> StreamingResponse:
+    """
+    Stream a job's results as NDJSON in completion order, starting after the
+    ``seq`` cursor ``after``. With ``wait`` the stream stays open until the
+    job completes; otherwise it ends with the results available now.
+    """
+    jobs = _get_jobs(request)
+    await _job_status(jobs, job_id)
+
+    async def stream() -> AsyncGenerator[bytes, None]:
+        async with aclosing(jobs.follow(job_id, after, wait)) as results:
+            async for result in results:
+                yield orjson.dumps(result) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@jobs_router.delete("/{job_id}")
+async def delete_job(request: Request, job_id: str):
+    """Cancel a bulk job and drop its results."""
+    if not await _get_jobs(request).delete(job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {"id": job_id, "deleted": True}
 
 
 @default_router.get("/health")
@@ -296,6 +1064,9 @@ async def health_check(request: Request):
             }
 
         memory_stats = vs.get_memory_usage()
+        admission = getattr(request.app.state, "admission", None)
+        prefetcher = getattr(request.app.state, "prefetcher", None)
+        jobs = getattr(request.app.state, "jobs", None)
 
         return {
             "status": "healthy",
@@ -304,6 +1075,19 @@ async def health_check(request: Request):
                 "resident_mb": f"{memory_stats['resident_memory']:.2f}",
                 "virtual_mb": f"{memory_stats['virtual_memory']:.2f}",
             },
+            "cache": vs.response_cache.stats() if vs.response_cache else None,
+            "near_duplicate_cache": (
+                vs.near_duplicate_cache.stats() if vs.near_duplicate_cache else None
+            ),
+            "encoded_image_cache": (
+                vs.encoded_image_cache.stats() if vs.encoded_image_cache else None
+            ),
+            "scheduler": vs.scheduler.stats() if vs.scheduler else None,
+            "backends": vs.backends.stats() if vs.backends else None,
+            "single_flight": vs.single_flight_stats(),
+            "admission": admission.stats() if admission else None,
+            "prefetch": prefetcher.stats() if prefetcher else None,
+            "jobs": jobs.stats() if jobs else None,
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
 
@@ -313,3 +1097,9 @@ async def health_check(request: Request):
             "message": str(e),
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
+
+
+@default_router.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics: per-stage latency, errors, and ingestion stats."""
+    return Response(latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -20,11 +22,27 @@ class ChatMessage(BaseModel):
     content: str | list[ContentPartImage | ContentPartText]
 
 
+class BoundingBox(BaseModel):
+    x_min: float
+    y_min: float
+    x_max: float
+    y_max: float
+
+
+class RegionOfInterestOptions(BaseModel):
+    # Fractions of the frame (0-1), or pixels when any coordinate exceeds 1
+    boxes: list[BoundingBox] | None = None
+    reference: str | None = None  # URL or base64 frame to locate motion against
+
+
 class ChatCompletionRequest(BaseModel):
     model: str
     messages: list[ChatMessage]
     temperature: float | None = 1.0
+    max_tokens: int | None = None
+    stop: str | list[str] | None = None
     stream: bool | None = False
+    roi: RegionOfInterestOptions | None = None
 
 
 class ChatChoice(BaseModel):
@@ -33,6 +51,14 @@ class ChatChoice(BaseModel):
     finish_reason: str
 
 
+class TimelineEntry(BaseModel):
+    image: int = 0  # index of the clip among the request's images
+    frame: int
+    start: float | None = None  # seconds into the clip
+    end: float | None = None
+    answer: str
+
+
 class ChatCompletionResponse(BaseModel):
     id: str
     object: str = "chat.completion"
@@ -40,6 +66,38 @@ class ChatCompletionResponse(BaseModel):
     model: str
     choices: list[ChatChoice]
     usage: dict[str, int]
+    timeline: list[TimelineEntry] | None = None
+
+
+class OllamaGenerateOptions(BaseModel):
+    num_keep: int | None = 5
+    seed: int | None = 42
+    num_predict: int | None = 100
+    top_k: int | None = 20
+    top_p: float | None = 0.9
+    min_p: float | None = 0.0
+    typical_p: float | None = 0.7
+    repeat_last_n: int | None = 33
+    temperature: float | None = 0.8
+    repeat_penalty: float | None = 1.2
+    presence_penalty: float | None = 1.5
+    frequency_penalty: float | None = 1.0
+    mirostat: int | None = 1
+    mirostat_tau: float | None = 0.8
+    mirostat_eta: float | None = 0.6
+    penalize_newline: bool | None = True
+    stop: list[str] | None = ["\\n", "user:"]
+    numa: bool | None = False
+    num_ctx: int | None = 1024
+    num_batch: int | None = 2
+    num_gpu: int | None = 1
+    main_gpu: int | None = 0
+    low_vram: bool | None = False
+    vocab_only: bool | None = False
+    use_mmap: bool | None = True
+    use_mlock: bool | None = False
+    num_thread: int | None = 8
+    timeout: float | None = None  # seconds; end-to-end request deadline
 
 
 class OllamaMessage(BaseModel):
@@ -54,6 +112,8 @@ class OllamaChatRequest(BaseModel):
     stream: bool = False
     temperature: float | None = None
     max_tokens: int | None = None
+    options: OllamaGenerateOptions | None = None
+    roi: RegionOfInterestOptions | None = None
 
 
 class OllamaChatResponse(BaseModel):
@@ -61,6 +121,7 @@ class OllamaChatResponse(BaseModel):
     created_at: str
     message: OllamaMessage
     done: bool
+    timeline: list[TimelineEntry] | None = None
 
 
 class OllamaShowModelRequest(BaseModel):
@@ -87,42 +148,13 @@ class OllamaModelShowResponse(BaseModel):
     modified_at: str
 
 
-class OllamaGenerateOptions(BaseModel):
-    num_keep: int | None = 5
-    seed: int | None = 42
-    num_predict: int | None = 100
-    top_k: int | None = 20
-    top_p: float | None = 0.9
-    min_p: float | None = 0.0
-    typical_p: float | None = 0.7
-    repeat_last_n: int | None = 33
-    temperature: float | None = 0.8
-    repeat_penalty: float | None = 1.2
-    presence_penalty: float | None = 1.5
-    frequency_penalty: float | None = 1.0
-    mirostat: int | None = 1
-    mirostat_tau: float | None = 0.8
-    mirostat_eta: float | None = 0.6
-    penalize_newline: bool | None = True
-    stop: list[str] | None = ["\\n", "user:"]
-    numa: bool | None = False
-    num_ctx: int | None = 1024
-    num_batch: int | None = 2
-    num_gpu: int | None = 1
-    main_gpu: int | None = 0
-    low_vram: bool | None = False
-    vocab_only: bool | None = False
-    use_mmap: bool | None = True
-    use_mlock: bool | None = False
-    num_thread: int | None = 8
-
-
 class OllamaGenerateRequest(BaseModel):
     model: str
     prompt: str
     stream: bool | None = False
     options: OllamaGenerateOptions | None = OllamaGenerateOptions()
     images: list[str] | None = None
+    roi: RegionOfInterestOptions | None = None
 
 
 class OllamaGenerateResponse(BaseModel):
@@ -137,3 +169,108 @@ class OllamaGenerateResponse(BaseModel):
     prompt_eval_duration: int
     eval_count: int
     eval_duration: int
+    timeline: list[TimelineEntry] | None = None
+
+
+class VisionQueryRequest(BaseModel):
+    model: str | None = None
+    image: str
+    prompts: list[str]
+
+
+class VisionQueryAnswer(BaseModel):
+    prompt: str
+    answer: str
+
+
+class VisionQueryResponse(BaseModel):
+    model: str
+    created_at: str
+    answers: list[VisionQueryAnswer]
+    total_duration: int
+
+
+class SkillRequest(BaseModel):
+    model: str | None = None
+    images: list[str]
+    objects: list[str]
+
+
+class DetectRequest(SkillRequest):
+    max_objects: int | None = None
+
+
+class CaptionRequest(BaseModel):
+    model: str | None = None
+    images: list[str]
+    length: Literal["short", "normal", "long"] = "normal"
+
+
+class ImagePoint(BaseModel):
+    x: float
+    y: float
+
+
+class DetectResult(BaseModel):
+    image: int
+    object: str
+    objects: list[BoundingBox]
+
+
+class PointResult(BaseModel):
+    image: int
+    object: str
+    points: list[ImagePoint]
+
+
+class SegmentResult(BaseModel):
+    image: int
+    object: str
+    path: str
+    bbox: BoundingBox | None = None
+
+
+class CaptionResult(BaseModel):
+    image: int
+    caption: str
+
+
+class DetectResponse(BaseModel):
+    model: str
+    created_at: str
+    results: list[DetectResult]
+    total_duration: int
+
+
+class PointResponse(BaseModel):
+    model: str
+    created_at: str
+    results: list[PointResult]
+    total_duration: int
+
+
+class SegmentResponse(BaseModel):
+    model: str
+    created_at: str
+    results: list[SegmentResult]
+    total_duration: int
+
+
+class CaptionResponse(BaseModel):
+    model: str
+    created_at: str
+    results: list[CaptionResult]
+    total_duration: int
+
+
+class JobStatusResponse(BaseModel):
+    id: str
+    model: str
+    status: Literal["uploading", "queued", "running", "completed"]
+    created_at: float
+    finished_at: float | None = None
+    total: int
+    pending: int
+    running: int
+    succeeded: int
+    failed: int
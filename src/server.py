@@ -0,0 +1,37 @@
+import os
+import tempfile
+from pathlib import Path
+
+import uvicorn
+
+from config import settings
+
+
+def main() -> None:
+    """
+    Serve the API with ``WORKERS`` processes (``python src/server.py``).
+
+    Worker processes share nothing in memory, so unless configured otherwise
+    they get a common SQLite response cache, prefetch lock and Prometheus
+    multiprocess directory in a fresh temporary directory.
+    """
+    if settings.WORKERS > 1:
+        shared = Path(tempfile.mkdtemp(prefix="moondream-api-"))
+        if not settings.RESPONSE_CACHE_PATH:
+            os.environ["RESPONSE_CACHE_PATH"] = str(shared / "responses.sqlite")
+        if not settings.PREFETCH_LOCK_PATH:
+            os.environ["PREFETCH_LOCK_PATH"] = str(shared / "prefetch.lock")
+        if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+            (shared / "metrics").mkdir()
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(shared / "metrics")
+    uvicorn.run(
+        "api:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WORKERS,
+        app_dir=str(Path(__file__).parent),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+
+@dataclass
+class _Call[T]:
+    task: asyncio.Future[T]
+    waiters: int = 0
+
+
+class SingleFlight[T]:
+    """
+    Share one in-progress computation per key among concurrent callers.
+
+    The first caller for a key starts the work; later callers wait on the same
+    task, and its result or exception reaches every one of them. A caller
+    that is cancelled (e.g. its client disconnected) or runs out of its own
+    ``timeout`` only stops waiting; the shared work is cancelled once no
+    caller is left.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call[T]] = {}
+        self.shared = 0
+        self.cancelled = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _finish(self, key: str, call: _Call[T], task: asyncio.Future[T]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter has gone
+
+    async def do(
+        self, key: str, fn: Callable[[], Awaitable[T]], timeout: float | None = None
+    ) -> T:
+        """
+        Return ``await fn()``, sharing the call with concurrent callers. Waits
+        at most ``timeout`` seconds (``TimeoutError``) without affecting them.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call, task))
+        else:
+            self.shared += 1
+        call.waiters += 1
+        try:
+            # Shield so one waiter leaving does not cancel the others' work
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self.cancelled += 1
+                call.task.cancel()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "inflight": len(self._calls),
+            "shared": self.shared,
+            "cancelled": self.cancelled,
+        }
@@ -1,13 +1,226 @@
+import asyncio
+import base64
+import binascii
+import hashlib
 import io
+import math
 import time
+from collections.abc import AsyncGenerator, Iterator
+from contextlib import (
+    AbstractAsyncContextManager,
+    aclosing,
+    contextmanager,
+    nullcontext,
+)
+from typing import Any
 
+import httpx
 import moondream as md
 import psutil
 from moondream.types import VLM as VLMClient
+from moondream.types import Base64EncodedImage, EncodedImage
 from PIL import Image
 
+from backend_pool import Backend, BackendPool
+from batch_scheduler import BatchScheduler
 from config import resolve_proxy, settings
+from encoded_image_cache import EncodedImageCache
 from exceptions import ImageAnalysisError, ImageLoadError
+from executor import (
+    get_process_pool,
+    iterate_blocking,
+    run_blocking,
+    run_in_process,
+)
+from generation import NO_LIMITS, GenerationLimits, StopMatcher, estimate_tokens
+from keyframes import (
+    Clip,
+    build_timeline,
+    extract_clip,
+    format_entry,
+    is_multi_frame,
+    is_video,
+    may_have_frames,
+)
+from metrics import record_image, record_upload, stage
+from near_duplicate import NearDuplicateCache, dhash
+from resilience import deadline_lifted, own_wait, with_retries
+from response_cache import (
+    ResponseCache,
+    SqliteResponseStore,
+    image_digest,
+    make_cache_key,
+)
+from roi import Box, RegionOfInterest, motion_thumbnail
+from single_flight import SingleFlight
+
+# Magic numbers of the formats we accept (plus video clips, see
+# ``keyframes.is_video``); anything else is rejected before the rest of the
+# body is downloaded or decoded.
+_IMAGE_SIGNATURES = (
+    b"\xff\xd8\xff",  # JPEG
+    b"\x89PNG\r\n\x1a\n",  # PNG
+    b"GIF87a",
+    b"GIF89a",
+    b"BM",  # BMP
+    b"II*\x00",  # TIFF (little-endian)
+    b"MM\x00*",  # TIFF (big-endian)
+)
+_HEADER_BYTES = 12
+# Longest ``data:<mediatype>;base64,`` prefix looked at for the payload's comma
+_DATA_URI_MAX_PREFIX = 256
+
+
+def _check_image_header(head: bytes) -> None:
+    """Raise ImageLoadError unless ``head`` starts like a supported image."""
+    if head.startswith(_IMAGE_SIGNATURES) or is_video(head):
+        return
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return
+    raise ImageLoadError("Failed to load image: unsupported or non-image content")
+
+
+def _check_image_size(num_bytes: int) -> None:
+    """Raise ImageLoadError if an encoded image exceeds MAX_IMAGE_BYTES."""
+    if num_bytes > settings.MAX_IMAGE_BYTES:
+        raise ImageLoadError(
+            f"Failed to load image: {num_bytes} bytes exceeds the "
+            f"{settings.MAX_IMAGE_BYTES} byte limit"
+        )
+
+
+class _ImageDownload:
+    """Accumulate a streamed image body, enforcing the byte cap and header check."""
+
+    def __init__(self, content_length: str | None) -> None:
+        if content_length is not None and content_length.isdigit():
+            _check_image_size(int(content_length))
+        self._buffer = bytearray()
+        self._header_checked = False
+
+    def feed(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        _check_image_size(len(self._buffer))
+        if not self._header_checked and len(self._buffer) >= _HEADER_BYTES:
+            _check_image_header(bytes(self._buffer[:_HEADER_BYTES]))
+            self._header_checked = True
+
+    def getvalue(self) -> bytes:
+        if not self._header_checked:
+            _check_image_header(bytes(self._buffer))
+        return bytes(self._buffer)
+
+
+def _base64_start(source: str | memoryview) -> int:
+    """Offset of the base64 payload: past the comma of a data URI, else 0."""
+    head = source[:_DATA_URI_MAX_PREFIX]
+    if isinstance(head, str):
+        head = head.encode("ascii", "replace")
+    else:
+        head = head.tobytes()
+    if not head.startswith(b"data:"):
+        return 0
+    comma = head.find(b",")
+    if comma < 0:
+        raise ImageLoadError("Failed to load image: malformed data URI")
+    return comma + 1
+
+
+def _decode_base64_image(source: str | bytes | bytearray | memoryview) -> bytes:
+    """
+    Decode a base64 payload or ``data:`` URI after checking its size and header.
+
+    ``binascii`` reads ASCII strings and buffers in place and buffers are
+    sliced as memoryviews, so a bare payload is decoded straight into the
+    result, which ``BytesIO`` then shares with PIL. Oversized payloads are
+    rejected before anything is decoded.
+    """
+    if not isinstance(source, str):
+        source = memoryview(source).cast("B")
+    start = _base64_start(source)
+    _check_image_size((len(source) - start) * 3 // 4)
+    payload = source[start:] if start else source
+    _check_image_header(binascii.a2b_base64(payload[:16]))
+    return binascii.a2b_base64(payload)
+
+
+def _open_image(
+    data: bytes, target_size: int | None = None, roi: RegionOfInterest | None = None
+) -> Image.Image:
+    """
+    Decode raw encoded image bytes with PIL, cropped to ``roi`` if given.
+
+    JPEGs larger than ``target_size`` (default ``MAX_IMAGE_SIZE``) are decoded
+    in draft mode, which lets libjpeg downscale by 1/2, 1/4 or 1/8 during the
+    DCT instead of materialising every full-resolution pixel. The result is
+    still at least ``target_size`` on its longest edge, so ``_resize_image``
+    finishes the job with the configured filter on a much smaller image.
+    With a crop, it is the crop that must keep ``target_size``, so a small
+    region is decoded at (or near) full resolution.
+    """
+    target_size = target_size or settings.MAX_IMAGE_SIZE
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    box = _region_box(image, data, roi) if roi is not None else None
+    extent = max(box[2] - box[0], box[3] - box[1]) if box else max(width, height)
+    if image.format == "JPEG" and extent > target_size:
+        scale = target_size / extent
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+    # Decode now, on the worker pool, rather than lazily on first pixel access
+    image.load()
+    if box is not None:
+        # Draft mode may have scaled the frame down
+        scale_x, scale_y = image.size[0] / width, image.size[1] / height
+        image = image.crop(
+            (
+                int(box[0] * scale_x),
+                int(box[1] * scale_y),
+                math.ceil(box[2] * scale_x),
+                math.ceil(box[3] * scale_y),
+            )
+        )
+    return image
+
+
+def _region_box(
+    image: Image.Image, data: bytes, roi: RegionOfInterest
+) -> tuple[int, int, int, int] | None:
+    """Pixel crop of ``roi`` in the frame ``image`` has opened (not yet decoded)."""
+    preview = None
+    if roi.reference is not None:
+        if image.format == "JPEG":
+            # Motion only needs a thumbnail: decode at 1/8 scale
+            preview = Image.open(io.BytesIO(data))
+            preview.draft("L", (1, 1))
+        else:
+            preview = image
+        preview.load()
+    return roi.crop_box(
+        image.size, preview, settings.ROI_PADDING, settings.ROI_MIN_SIZE
+    )
+
+
+@contextmanager
+def _load_errors() -> Iterator[None]:
+    """Surface any failure while loading an image as ``ImageLoadError``."""
+    try:
+        yield
+    except ImageLoadError:
+        raise
+    except Exception as e:
+        raise ImageLoadError(f"Failed to load image: {e}")
+
+
+def _decode_image(
+    data: bytes, kind: str, roi: RegionOfInterest | None = None
+) -> Image.Image:
+    """``_open_image`` timed as the ``decode`` stage, recording the input size."""
+    with stage("decode"), _load_errors():
+        image = _open_image(data, roi=roi)
+    # Baseline for the bytes a cloud upload saves (see ``_encode_upload``)
+    image.info["source_bytes"] = len(data)
+    record_image(len(data), kind, image.size)
+    return image
 
 
 def load_image(source: str) -> Image.Image:
@@ -18,27 +231,333 @@ def load_image(source: str) -> Image.Image:
     - http/https URLs (fetched via GET)
     - data URIs (``data:image/...;base64,...``)
     - raw base64-encoded image bytes
+
+    Payloads larger than ``MAX_IMAGE_BYTES`` or without a recognised image
+    header are rejected before they are fully read or decoded.
     """
-    try:
-        if source.startswith(("http://", "https://")):
-            import httpx
+    if source.startswith(("http://", "https://")):
+        return _decode_image(_download_image(source), "url")
+    return _decode_image(_inline_image_bytes(source), "base64")
+
+
+def _download_image(url: str) -> bytes:
+    """Fetch an image URL without the shared async client."""
+    with (
+        stage("fetch"),
+        _load_errors(),
+        httpx.stream(
+            "GET",
+            url,
+            timeout=settings.HTTP_READ_TIMEOUT,
+            proxy=resolve_proxy(url),
+        ) as response,
+    ):
+        response.raise_for_status()
+        download = _ImageDownload(response.headers.get("Content-Length"))
+        for chunk in response.iter_bytes():
+            download.feed(chunk)
+    return download.getvalue()
 
-            response = httpx.get(source, timeout=30, proxy=resolve_proxy(source))
+
+def _inline_image_bytes(source: str) -> bytes:
+    """Encoded image bytes of a data URI or base64 payload."""
+    with stage("decode"), _load_errors():
+        return _decode_base64_image(source)
+
+
+def _downscale(image: Image.Image, max_size: int, resample: int) -> Image.Image:
+    """Shrink ``image`` to ``max_size`` on its longest edge, if it is larger."""
+    longest_edge = max(image.size)
+    if longest_edge <= max_size:
+        return image
+    scale = max_size / longest_edge
+    new_size = (int(image.size[0] * scale), int(image.size[1] * scale))
+    return image.resize(new_size, resample)
+
+
+def _encode_upload(
+    image: Image.Image, fmt: str, quality: int
+) -> tuple[Base64EncodedImage, int]:
+    """
+    Encode ``image`` as an RGB JPEG or WebP data URI, the form the cloud SDK
+    uploads (its ``encode_image`` would send JPEG at quality 95). Returns the
+    data URI and the encoded image size in bytes.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        fmt = "jpeg"
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    payload = base64.b64encode(buffer.getbuffer()).decode("ascii")
+    encoded = Base64EncodedImage(image_url=f"data:image/{fmt};base64,{payload}")
+    return encoded, buffer.tell()
+
+
+def _decode_and_resize(
+    data: bytes, max_size: int, resample: str, roi: RegionOfInterest | None = None
+) -> tuple[Image.Image, tuple[int, int]]:
+    """
+    Decode, crop and downscale an image in an image pool process.
+
+    Returns the image and its decoded size before the downscale.
+    """
+    image = _open_image(data, max_size, roi)
+    image.info["source_bytes"] = len(data)
+    return _downscale(image, max_size, Image.Resampling[resample.upper()]), image.size
+
+
+async def decode_image_async(
+    data: bytes, kind: str, roi: RegionOfInterest | None = None
+) -> Image.Image:
+    """
+    ``_decode_image`` off the event loop. With ``IMAGE_PROCESS_WORKERS`` set it
+    runs on the process pool, which also downscales to ``MAX_IMAGE_SIZE`` so
+    neither step holds this process's GIL.
+    """
+    if get_process_pool() is None:
+        return await run_blocking(_decode_image, data, kind, roi)
+    with stage("decode"), _load_errors():
+        image, size = await run_in_process(
+            _decode_and_resize,
+            data,
+            settings.MAX_IMAGE_SIZE,
+            settings.IMAGE_RESAMPLE,
+            roi,
+        )
+    record_image(len(data), kind, size)
+    return image
+
+
+def _decode_clip(data: bytes, kind: str) -> Clip:
+    """``extract_clip`` timed as the ``decode`` stage, recording the input size."""
+    with stage("decode"), _load_errors():
+        clip = extract_clip(
+            data,
+            settings.KEYFRAMES_MAX,
+            settings.KEYFRAME_MIN_CHANGE,
+            settings.KEYFRAME_SAMPLE_FRAMES,
+        )
+    record_image(len(data), kind, clip.size)
+    return clip
+
+
+# Loads in progress, shared by concurrent requests for the same source
+_image_loads: SingleFlight[Image.Image] = SingleFlight()
+_media_loads: SingleFlight[Image.Image | Clip] = SingleFlight()
+
+
+def _source_key(source: str) -> str:
+    """Identify an image source: the URL itself, or a hash of inline data."""
+    if source.startswith(("http://", "https://")):
+        return source
+    return hashlib.blake2b(source.encode(), digest_size=20).hexdigest()
+
+
+async def load_image_async(
+    source: str, http_client: httpx.AsyncClient | None = None
+) -> Image.Image:
+    """
+    Load an image (see ``load_image``) without blocking the event loop.
+
+    URLs are streamed with the shared ``http_client`` when one is given, so
+    repeated fetches from the same camera host reuse pooled connections;
+    decoding always runs on the worker pool. Concurrent loads of the same
+    URL or payload share one fetch and decode, and get the same image object,
+    which callers must treat as read-only. Each caller waits for it at most
+    ``FETCH_DEADLINE_SHARE`` of its own remaining deadline.
+    """
+    with own_wait("fetch", settings.FETCH_DEADLINE_SHARE) as timeout:
+        return await _image_loads.do(
+            _source_key(source),
+            lambda: _load_image_async(source, http_client),
+            timeout,
+        )
+
+
+async def _load_image_async(
+    source: str, http_client: httpx.AsyncClient | None
+) -> Image.Image:
+    """Load with retries, outside the deadline of the caller that started it."""
+    with deadline_lifted():
+        return await with_retries("fetch", lambda: _fetch_image(source, http_client))
+
+
+async def _fetch_image(
+    source: str, http_client: httpx.AsyncClient | None
+) -> Image.Image:
+    is_url = source.startswith(("http://", "https://"))
+    if not is_url and get_process_pool() is not None:
+        data = await run_blocking(_inline_image_bytes, source)
+        return await decode_image_async(data, "base64")
+    if http_client is None or not is_url:
+        return await run_blocking(load_image, source)
+    data, _ = await fetch_image_bytes(source, http_client)
+    assert data is not None  # only conditional requests get a 304
+    return await decode_image_async(data, "url")
+
+
+async def load_media_async(
+    source: str,
+    http_client: httpx.AsyncClient | None = None,
+    roi: RegionOfInterest | None = None,
+) -> Image.Image | Clip:
+    """
+    Like ``load_image_async``, but a video clip, animated GIF/WebP/PNG or
+    multi-page TIFF comes back as a ``Clip`` of its most informative frames
+    (see ``keyframes.extract_clip``) instead of its first frame.
+
+    A still image is cropped to ``roi`` (see ``load_region_async``) as it is
+    decoded; clips are kept whole.
+    """
+    key = _source_key(source) if roi is None else f"{_source_key(source)}#{roi.key}"
+    with own_wait("fetch", settings.FETCH_DEADLINE_SHARE) as timeout:
+        return await _media_loads.do(
+            key, lambda: _load_media_async(source, http_client, roi), timeout
+        )
+
+
+async def _load_media_async(
+    source: str, http_client: httpx.AsyncClient | None, roi: RegionOfInterest | None
+) -> Image.Image | Clip:
+    with deadline_lifted():
+        return await with_retries(
+            "fetch", lambda: _fetch_media(source, http_client, roi)
+        )
+
+
+async def _fetch_media(
+    source: str, http_client: httpx.AsyncClient | None, roi: RegionOfInterest | None
+) -> Image.Image | Clip:
+    if not source.startswith(("http://", "https://")):
+        data, kind = await run_blocking(_inline_image_bytes, source), "base64"
+    elif http_client is None:
+        data, kind = await run_blocking(_download_image, source), "url"
+    else:
+        data, _ = await fetch_image_bytes(source, http_client)
+        assert data is not None  # only conditional requests get a 304
+        kind = "url"
+    if may_have_frames(data[:_HEADER_BYTES]) and await run_blocking(
+        is_multi_frame, data
+    ):
+        return await run_blocking(_decode_clip, data, kind)
+    return await decode_image_async(data, kind, roi)
+
+
+async def load_region_async(
+    boxes: list[Box],
+    reference: str | None,
+    http_client: httpx.AsyncClient | None = None,
+) -> RegionOfInterest | None:
+    """
+    Build the region of interest of a request: its ``boxes`` and, with a
+    ``reference`` frame (URL or base64, loaded like any image), the motion
+    between that frame and each analysed one. ``None`` when there is neither.
+    """
+    if not boxes and not reference:
+        return None
+    thumbnail = None
+    if reference:
+        image = await load_image_async(reference, http_client)
+        thumbnail = await run_blocking(motion_thumbnail, image)
+    return RegionOfInterest.create(
+        boxes, thumbnail, _source_key(reference) if reference else ""
+    )
+
+
+async def fetch_image_bytes(
+    url: str,
+    http_client: httpx.AsyncClient,
+    headers: dict[str, str] | None = None,
+) -> tuple[bytes | None, httpx.Headers]:
+    """
+    Stream an image body with the byte cap and header check of ``load_image``.
+
+    Returns the body and the response headers; the body is ``None`` when a
+    conditional request (``If-None-Match``...) is answered ``304``.
+    """
+    with stage("fetch"), _load_errors():
+        async with http_client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return None, response.headers
             response.raise_for_status()
-            return Image.open(io.BytesIO(response.content))
-        elif source.startswith("data:"):
-            import base64
+            download = _ImageDownload(response.headers.get("Content-Length"))
+            async for chunk in response.aiter_bytes():
+                download.feed(chunk)
+    return download.getvalue(), response.headers
 
-            _, b64_data = source.split(",", 1)
-            image_bytes = base64.b64decode(b64_data)
-            return Image.open(io.BytesIO(image_bytes))
-        else:
-            import base64
 
-            image_bytes = base64.b64decode(source)
-            return Image.open(io.BytesIO(image_bytes))
-    except Exception as e:
-        raise ImageLoadError(f"Failed to load image: {e}")
+def _image_bytes(image: Image.Image | EncodedImage) -> bytes:
+    """JPEG bytes of ``image``, the form the Photon engine takes."""
+    if isinstance(image, Base64EncodedImage):
+        return base64.b64decode(image.image_url.partition(",")[2])
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def _open_answer(
+    client: VLMClient,
+    image: Image.Image | EncodedImage,
+    user_prompt: str,
+    limits: GenerationLimits,
+) -> tuple[Iterator[str], Any]:
+    """
+    Start a streamed query; returns the answer chunks and the upstream stream
+    to close. Photon's ``query(stream=True)`` generator keeps the engine
+    generating after it is closed, so Photon clients go through ``invoke``,
+    whose stream cancels the engine request on ``close``. Cloud streams stop
+    when their generator is closed.
+    """
+    invoke = getattr(client, "invoke", None)
+    if invoke is None:
+        answer = client.query(
+            image, user_prompt, stream=True, settings=limits.sampling_settings()
+        ).get("answer", "")
+        if isinstance(answer, str):
+            answer = iter((answer,))
+        return answer, answer
+    stream = invoke(
+        "query",
+        image=_image_bytes(image),
+        question=user_prompt,
+        stream=True,
+        settings=limits.sampling_settings(),
+    )
+    return (str(update.get("text", "")) for update in stream), stream
+
+
+def _generate(
+    client: VLMClient,
+    image: Image.Image | EncodedImage,
+    user_prompt: str,
+    limits: GenerationLimits,
+) -> Iterator[str]:
+    """
+    Stream ``client.query`` with ``limits``. The first stop sequence ends the
+    answer and closes the upstream stream, which cancels the generation on
+    both Photon and the cloud (see ``_open_answer``).
+    """
+    answer, upstream = _open_answer(client, image, user_prompt, limits)
+    matcher = StopMatcher(limits.stop)
+    try:
+        for chunk in answer:
+            text = matcher.feed(chunk) if limits.stop else chunk
+            if text:
+                yield text
+            if matcher.stopped:
+                return
+        tail = matcher.flush()
+        if tail:
+            yield tail
+    finally:
+        close = getattr(upstream, "close", None)
+        if close is not None:
+            close()
 
 
 class VisionService:
@@ -47,77 +566,603 @@ class VisionService:
     def __init__(self, api_key: str = settings.MOONDREAM_API_KEY) -> None:
         self.api_key: str = api_key
         self.model_name: str = settings.MODEL_NAME
-        self.local: bool = settings.MOONDREAM_MODE == "local"
+        backends = settings.MOONDREAM_BACKENDS or settings.MOONDREAM_MODE
+        self.backend_kinds = [
+            kind.strip() for kind in backends.split(",") if kind.strip()
+        ]
+        self.local: bool = "local" in self.backend_kinds
         self._client: VLMClient | None = None
+        self.backends: BackendPool | None = None
+        self._resample = Image.Resampling[settings.IMAGE_RESAMPLE.upper()]
+        # Cloud-only pools upload a re-encoded, smaller frame (see
+        # ``_encode_image``); Photon gets the image at MAX_IMAGE_SIZE
+        self.upload_size = (
+            settings.MAX_IMAGE_SIZE
+            if self.local
+            else min(settings.MAX_IMAGE_SIZE, settings.CLOUD_MAX_IMAGE_SIZE)
+        )
+        # Global inference budget shared by every route
+        self._inference_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_INFERENCES)
+        self.response_cache: ResponseCache | None = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            store = (
+                SqliteResponseStore(settings.RESPONSE_CACHE_PATH)
+                if settings.RESPONSE_CACHE_PATH
+                else None
+            )
+            self.response_cache = ResponseCache(
+                settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL, store
+            )
+        self.encoded_image_cache: EncodedImageCache | None = None
+        if settings.ENCODED_IMAGE_CACHE_ENABLED:
+            self.encoded_image_cache = EncodedImageCache(
+                settings.ENCODED_IMAGE_CACHE_MAX_BYTES,
+                settings.ENCODED_IMAGE_CACHE_TTL,
+            )
+        self.near_duplicate_cache: NearDuplicateCache | None = None
+        if settings.NEAR_DUPLICATE_CACHE_ENABLED:
+            self.near_duplicate_cache = NearDuplicateCache(
+                settings.NEAR_DUPLICATE_MAX_DISTANCE,
+                settings.NEAR_DUPLICATE_TTL,
+                settings.NEAR_DUPLICATE_FRAMES_PER_SOURCE,
+            )
         self._init_client()
+        # Identical inferences in flight when the response cache is disabled
+        self._inflight: SingleFlight[str] = SingleFlight()
+        self.scheduler: BatchScheduler | None = None
+        if self.local:
+            local_client = self._local_backend().client
+            self.scheduler = BatchScheduler(
+                lambda image, prompt, limits: self.analyze_image(
+                    image, prompt, local_client, limits
+                ),
+                max_batch_size=settings.LOCAL_BATCH_MAX_SIZE,
+                max_wait=settings.LOCAL_BATCH_MAX_WAIT_MS / 1000,
+                dispatch=self._batch_dispatch_mode(),
+            )
+
+    def _cloud_api_keys(self) -> list[str]:
+        """``MOONDREAM_API_KEY`` followed by any extra ``MOONDREAM_API_KEYS``."""
+        extra = [key.strip() for key in settings.MOONDREAM_API_KEYS.split(",")]
+        keys = [self.api_key, *(key for key in extra if key)]
+        return list(dict.fromkeys(keys))
+
+    def _new_backend(self, name: str, client: VLMClient, *, local: bool) -> Backend:
+        return Backend(
+            name,
+            client,
+            local=local,
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            cooldown=settings.BREAKER_COOLDOWN,
+        )
 
     def _init_client(self) -> None:
-        """Initialize the Moondream client (Cloud or Photon local)."""
+        """
+        Initialize the Moondream backends (Photon local and/or one cloud client
+        per API key) listed in ``MOONDREAM_BACKENDS``, in priority order.
+        """
         try:
-            if self.local:
-                self._client = md.vl(
-                    api_key=self.api_key,
-                    local=True,
-                    model=self.model_name,
-                )
-            else:
-                self._client = md.vl(
-                    api_key=self.api_key,
-                    model=self.model_name,
-                )
-            mode = "local (Photon)" if self.local else "cloud"
-            print(f"Moondream client initialized: mode={mode}, model={self.model_name}")
+            backends: list[Backend] = []
+            for kind in self.backend_kinds:
+                if kind == "local":
+                    client = md.vl(
+                        api_key=self.api_key,
+                        local=True,
+                        model=self.model_name,
+                    )
+                    backends.append(self._new_backend("local", client, local=True))
+                elif kind in ("api", "cloud"):
+                    for index, key in enumerate(self._cloud_api_keys()):
+                        client = md.vl(api_key=key, model=self.model_name)
+                        backends.append(
+                            self._new_backend(f"cloud-{index}", client, local=False)
+                        )
+                else:
+                    raise ValueError(f"unknown backend {kind!r}")
+            if not backends:
+                raise ValueError("no backends configured")
+            self.backends = BackendPool(
+                backends,
+                hedge_percentile=settings.HEDGE_PERCENTILE or None,
+                hedge_min_delay=settings.HEDGE_MIN_DELAY_MS / 1000,
+            )
+            self._client = self.backends.primary.client
+            names = ", ".join(backend.name for backend in backends)
+            print(
+                f"Moondream client initialized: backends={names}, "
+                f"model={self.model_name}"
+            )
         except Exception as e:
             raise RuntimeError(f"Failed to initialize Moondream client: {e}")
 
+    def _local_backend(self) -> Backend:
+        assert self.backends is not None
+        return next(backend for backend in self.backends.backends if backend.local)
+
+    def _pool(self) -> BackendPool:
+        if self.backends is None:
+            raise ImageAnalysisError("Moondream client not initialized")
+        return self.backends
+
+    def _batch_dispatch_mode(self) -> str:
+        """
+        Resolve ``LOCAL_BATCH_DISPATCH``.
+
+        ``auto`` is ``serial``: ``batch`` only pays off where the engine
+        really batches concurrent requests, so it is opt-in until
+        ``benchmarks/batching.py`` shows it beating ``serial`` on the target
+        hardware.
+        """
+        mode = settings.LOCAL_BATCH_DISPATCH
+        return "serial" if mode == "auto" else mode
+
     @property
     def model(self) -> VLMClient | None:
         """Access the underlying Moondream client (for health checks, etc.)."""
         return self._client
 
     def _resize_image(self, image: Image.Image) -> Image.Image:
-        """Resize image if it exceeds MAX_IMAGE_SIZE (useful for local mode)."""
-        longest_edge = max(image.size)
-        if longest_edge > settings.MAX_IMAGE_SIZE:
-            scale = settings.MAX_IMAGE_SIZE / longest_edge
-            new_size = (int(image.size[0] * scale), int(image.size[1] * scale))
-            return image.resize(new_size, Image.Resampling.LANCZOS)
-        return image
+        """Resize image if it exceeds the target size of this service's mode."""
+        if max(image.size) <= self.upload_size:
+            return image
+        with stage("resize"):
+            return _downscale(image, self.upload_size, self._resample)
+
+    def _prepare_image(self, image: Image.Image) -> Image.Image | EncodedImage:
+        """The image as a backend call should receive it (see ``_encode_image``)."""
+        if self.local:
+            return self._resize_image(image)
+        return self._encode_image(image)
 
-    def analyze_image(self, image: Image.Image, user_prompt: str) -> str:
+    def analyze_image(
+        self,
+        image: Image.Image | EncodedImage,
+        user_prompt: str,
+        client: VLMClient | None = None,
+        limits: GenerationLimits = NO_LIMITS,
+    ) -> str:
         """
         Analyze an image using the Moondream model.
 
         Args:
-            image: The image to analyze (PIL Image).
+            image: The image to analyze (PIL Image, or an ``encode_image``
+                result to skip re-encoding).
             user_prompt: The user's question about the image.
+            client: Backend client to use; defaults to the primary backend.
+            limits: Token limit, temperature and stop sequences. With stop
+                sequences the answer is streamed internally, so generation
+                ends as soon as one appears.
 
         Returns:
             Generated text answer.
         """
-        image = self._resize_image(image)
+        if isinstance(image, Image.Image):
+            image = self._prepare_image(image)
+        with stage("inference"):
+            try:
+                client = client or self._client
+                if client is None:
+                    raise RuntimeError("Moondream client not initialized")
+                if limits.stop:
+                    return "".join(
+                        _generate(client, image, user_prompt, limits)
+                    ).strip()
+                result = client.query(
+                    image, user_prompt, settings=limits.sampling_settings()
+                )
+                answer = result.get("answer", "")
+                return str(answer).strip()
+            except Exception as e:
+                raise ImageAnalysisError(f"Error analyzing image: {e}")
+
+    def _query_stream(
+        self,
+        image: Image.Image | EncodedImage,
+        user_prompt: str,
+        client: VLMClient | None = None,
+        limits: GenerationLimits = NO_LIMITS,
+    ) -> Iterator[str]:
+        """Yield answer chunks from a streamed ``client.query`` call."""
+        if isinstance(image, Image.Image):
+            image = self._prepare_image(image)
+        client = client or self._client
+        if client is None:
+            raise ImageAnalysisError("Moondream client not initialized")
+        with stage("inference"):
+            try:
+                yield from _generate(client, image, user_prompt, limits)
+            except Exception as e:
+                raise ImageAnalysisError(f"Error analyzing image: {e}")
+
+    def _run_skill(
+        self,
+        skill: str,
+        image: Image.Image | EncodedImage,
+        client: VLMClient | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """Call one of the SDK's structured skills (``detect``, ``caption``...)."""
+        if isinstance(image, Image.Image):
+            image = self._prepare_image(image)
+        with stage("inference"):
+            try:
+                client = client or self._client
+                if client is None:
+                    raise RuntimeError("Moondream client not initialized")
+                return dict(getattr(client, skill)(image, **kwargs))
+            except Exception as e:
+                raise ImageAnalysisError(f"Error running {skill}: {e}")
+
+    def _encode_image(self, image: Image.Image) -> EncodedImage:
+        """
+        Resize and encode a PIL image for the backends.
+
+        Photon gets the SDK's ``encode_image``. Cloud-only pools instead get
+        an upload re-encoded at ``UPLOAD_FORMAT``/``UPLOAD_QUALITY`` and
+        ``CLOUD_MAX_IMAGE_SIZE``, since upload time dominates cloud latency.
+        """
+        client = self._client
+        if client is None:
+            raise ImageAnalysisError("Moondream client not initialized")
+        resized = self._resize_image(image)
+        with stage("encode"):
+            try:
+                if self.local:
+                    return client.encode_image(resized)
+                encoded, num_bytes = _encode_upload(
+                    resized, settings.UPLOAD_FORMAT, settings.UPLOAD_QUALITY
+                )
+            except Exception as e:
+                raise ImageAnalysisError(f"Error encoding image: {e}")
+        record_upload(num_bytes, image.info.get("source_bytes"), settings.UPLOAD_FORMAT)
+        return encoded
+
+    async def _image_digest(self, image: Image.Image) -> str:
+        """Pixel hash keying the caches and in-flight inference sharing."""
+        return await run_blocking(image_digest, image)
+
+    async def _encoded(
+        self, image: Image.Image, digest: str | None
+    ) -> Image.Image | EncodedImage:
+        """
+        Return a cached encoding of ``image`` when the cache is enabled. For
+        cloud-only pools the image is always encoded here, once, so retries,
+        hedges and failovers resend the same buffer.
+        """
+        if self.encoded_image_cache is None or digest is None:
+            if self.local:
+                return image
+            return await run_blocking(self._encode_image, image)
+        return await self.encoded_image_cache.get_or_encode(
+            digest, lambda: run_blocking(self._encode_image, image)
+        )
+
+    async def _infer(
+        self,
+        image: Image.Image,
+        user_prompt: str,
+        digest: str | None = None,
+        limits: GenerationLimits = NO_LIMITS,
+    ) -> str:
+        """Run one inference on the backend pool within the global budget."""
+        encoded = await self._encoded(image, digest)
+
+        async def query(backend: Backend) -> str:
+            if backend.local and self.scheduler is not None:
+                return await self.scheduler.submit(encoded, user_prompt, limits)
+            return await run_blocking(
+                self.analyze_image, encoded, user_prompt, backend.client, limits
+            )
+
+        async def attempt() -> str:
+            async with self._inference_slots:
+                return await self._pool().call(query)
+
+        return await with_retries("inference", attempt)
+
+    def _exclusive(self, backend: Backend) -> AbstractAsyncContextManager[object]:
+        """Keep other GPU work out while ``backend`` runs an unbatched call."""
+        if backend.local and self.scheduler is not None:
+            return self.scheduler.exclusive()
+        return nullcontext()
+
+    async def _near_duplicate_hash(
+        self, image: Image.Image, source: str | None
+    ) -> int | None:
+        """Perceptual hash of ``image`` when near-duplicate matching applies."""
+        if self.near_duplicate_cache is None or source is None:
+            return None
+        return await run_blocking(dhash, image)
+
+    def _near_duplicate_answer(
+        self, source: str | None, user_prompt: str, frame_hash: int | None
+    ) -> str | None:
+        if self.near_duplicate_cache is None or source is None or frame_hash is None:
+            return None
+        return self.near_duplicate_cache.lookup(source, user_prompt, frame_hash)
+
+    def _remember_near_duplicate(
+        self, source: str | None, user_prompt: str, frame_hash: int | None, answer: str
+    ) -> None:
+        if (
+            self.near_duplicate_cache is not None
+            and source is not None
+            and frame_hash is not None
+        ):
+            self.near_duplicate_cache.store(source, user_prompt, frame_hash, answer)
+
+    async def analyze_image_async(
+        self,
+        image: Image.Image,
+        user_prompt: str,
+        *,
+        source: str | None = None,
+        near_duplicates: bool = True,
+        digest: str | None = None,
+        limits: GenerationLimits = NO_LIMITS,
+    ) -> str:
+        """
+        Analyze an image (see ``analyze_image``) on the worker pool.
+
+        Answers are served from the response cache when the same pixels were
+        already asked the same question, and identical requests in flight at
+        the same time share a single inference (even with the cache off). It
+        runs outside any one request's deadline: each request stops waiting
+        at its own, and the inference is cancelled only once every one of
+        those requests has gone away. The image encoding is cached
+        separately, so other prompts about the same frame skip re-encoding;
+        callers asking several questions can pass a precomputed ``digest``
+        (see ``image_digest``).
+
+        When the near-duplicate cache is enabled and ``source`` identifies the
+        camera, a recent answer for a perceptually identical frame from that
+        source is reused; pass ``near_duplicates=False`` to skip that match.
+        Answers are only shared between requests with the same ``limits``.
+        """
+        prompt_key = limits.prompt_key(user_prompt)
+        frame_hash = await self._near_duplicate_hash(image, source)
+        if near_duplicates:
+            answer = self._near_duplicate_answer(source, prompt_key, frame_hash)
+            if answer is not None:
+                return answer
+
+        digest = digest or await self._image_digest(image)
+        key = make_cache_key(digest, prompt_key, self.model_name)
+
+        async def infer() -> str:
+            # Shared by every request for ``key``, so the request that
+            # started it must not bound it; each request times out its own
+            # wait below, and the inference is cancelled once none is left
+            with deadline_lifted():
+                return await self._infer(image, user_prompt, digest, limits)
+
+        with own_wait("inference") as timeout:
+            if self.response_cache is None:
+                answer = await self._inflight.do(key, infer, timeout)
+            else:
+                answer = await self.response_cache.get_or_compute(key, infer, timeout)
+
+        self._remember_near_duplicate(source, prompt_key, frame_hash, answer)
+        return answer
+
+    async def answer_questions(
+        self, image: Image.Image, prompts: list[str]
+    ) -> list[str]:
+        """
+        Answer several prompts about one image from a single encoding.
+
+        The image is hashed and encoded once; the prompts then run
+        concurrently and answers are returned in prompt order.
+        """
+        digest = await self.prepare_image(image)
+        return list(
+            await asyncio.gather(
+                *(
+                    self.analyze_image_async(image, prompt, digest=digest)
+                    for prompt in prompts
+                )
+            )
+        )
+
+    async def prepare_image(self, image: Image.Image) -> str:
+        """
+        Hash and encode ``image`` ahead of several calls about it.
+
+        Returns the digest to pass to ``run_skill``/``analyze_image_async`` so
+        each call reuses the cached encoding.
+        """
+        digest = await self._image_digest(image)
+        await self._encoded(image, digest)
+        return digest
+
+    async def run_skill(
+        self,
+        skill: str,
+        image: Image.Image,
+        *,
+        digest: str | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """
+        Run a structured skill (``detect``, ``point``, ``caption``, ``segment``)
+        on the worker pool within the global inference budget.
+
+        Skills bypass the local micro-batcher, but hold its lock in serial
+        dispatch mode so they never overlap a batch on the GPU.
+        """
+        encoded = await self._encoded(image, digest)
+
+        async def run(backend: Backend) -> dict[str, Any]:
+            async with self._exclusive(backend):
+                return await run_blocking(
+                    self._run_skill, skill, encoded, backend.client, **kwargs
+                )
+
+        async def attempt() -> dict[str, Any]:
+            async with self._inference_slots:
+                return await self._pool().call(run)
+
+        return await with_retries("inference", attempt)
+
+    async def stream_image_analysis(
+        self,
+        image: Image.Image,
+        user_prompt: str,
+        *,
+        source: str | None = None,
+        near_duplicates: bool = True,
+        limits: GenerationLimits = NO_LIMITS,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Yield the answer for an image incrementally as the model generates it.
+
+        Cached answers (exact or near-duplicate) are yielded as a single
+        chunk. Closing the generator early, or a stop sequence in ``limits``,
+        stops pulling from the model and closes the upstream stream.
+        """
+        prompt_key = limits.prompt_key(user_prompt)
+        frame_hash = await self._near_duplicate_hash(image, source)
+        if near_duplicates:
+            answer = self._near_duplicate_answer(source, prompt_key, frame_hash)
+            if answer is not None:
+                yield answer
+                return
+
+        digest = await self._image_digest(image)
+        key: str | None = None
+        if self.response_cache is not None:
+            key = make_cache_key(digest, prompt_key, self.model_name)
+            cached = await self.response_cache.lookup(key)
+            if cached is not None:
+                yield cached
+                return
+
+        encoded = await self._encoded(image, digest)
+        chunks: list[str] = []
+        pool = self._pool()
+        # Streams are neither hedged nor failed over once started
+        backend = pool.select()
+        if backend is None:
+            raise ImageAnalysisError("No healthy Moondream backend available")
+        async with (
+            self._inference_slots,
+            self._exclusive(backend),
+            aclosing(
+                iterate_blocking(
+                    self._query_stream, encoded, user_prompt, backend.client, limits
+                )
+            ) as stream,
+        ):
+            with pool.track(backend):
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+
+        answer = "".join(chunks).strip()
+        if self.response_cache is not None and key is not None:
+            await self.response_cache.put(key, answer)
+        self._remember_near_duplicate(source, prompt_key, frame_hash, answer)
+
+    async def analyze_clip(
+        self, clip: Clip, user_prompt: str, limits: GenerationLimits = NO_LIMITS
+    ) -> list[dict[str, Any]]:
+        """
+        Answer ``user_prompt`` for every keyframe of ``clip`` concurrently and
+        return the timeline (see ``keyframes.build_timeline``).
+        """
+        answers = await asyncio.gather(
+            *(
+                self.analyze_image_async(frame.image, user_prompt, limits=limits)
+                for frame in clip.frames
+            )
+        )
+        return build_timeline(clip, list(answers))
+
+    async def stream_timeline(
+        self, clip: Clip, user_prompt: str, limits: GenerationLimits = NO_LIMITS
+    ) -> AsyncGenerator[str, None]:
+        """
+        Yield the timeline of ``clip`` line by line. Keyframes are analysed
+        concurrently; each line is sent once it can no longer merge with the
+        next keyframe's answer.
+        """
+        tasks = [
+            asyncio.ensure_future(
+                self.analyze_image_async(frame.image, user_prompt, limits=limits)
+            )
+            for frame in clip.frames
+        ]
         try:
-            start_time = time.time()
-            client = self._client
-            if client is None:
-                raise RuntimeError("Moondream client not initialized")
-            result = client.query(image, user_prompt)
-            end_time = time.time()
-            print(f"Query execution time: {end_time - start_time:.2f}s")
-            answer = result.get("answer", "")
-            return str(answer).strip()
-        except Exception as e:
-            raise ImageAnalysisError(f"Error analyzing image: {e}")
+            answers: list[str] = []
+            sent = 0
+            for task in tasks:
+                answers.append(await task)
+                entries = build_timeline(clip, answers)
+                final = entries if len(answers) == len(tasks) else entries[:-1]
+                for entry in final[sent:]:
+                    yield ("\n" if sent else "") + format_entry(entry)
+                    sent += 1
+        finally:
+            for task in tasks:
+                task.cancel()
 
     def calculate_token_cost(self, prompt: str, model_answer: str) -> tuple[int, int]:
         """
         Estimate token cost for usage reporting.
 
-        In cloud mode the actual token count comes from the Moondream API
-        response, but we return a character-based estimate here for the
-        OpenAI-compatible usage field.
+        The Moondream SDK does not report token counts, so both are estimated
+        from the text (see ``generation.estimate_tokens``).
+        """
+        return (estimate_tokens(prompt), estimate_tokens(model_answer))
+
+    async def warmup(self) -> None:
+        """
+        Run a throwaway decode, and a throwaway inference on every local
+        backend, so the first real request does not pay for cold pool
+        processes or model kernels. Cloud backends are billed per call, so
+        they are only warmed with ``WARMUP_CLOUD_INFERENCE``. Failures are
+        printed, not raised.
         """
-        return (len(prompt), len(model_answer))
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), "gray").save(buffer, format="PNG")
+        if get_process_pool() is not None:
+            await run_in_process(
+                _decode_and_resize,
+                buffer.getvalue(),
+                settings.MAX_IMAGE_SIZE,
+                settings.IMAGE_RESAMPLE,
+            )
+        image = _open_image(buffer.getvalue())
+        for backend in self._pool().backends:
+            if not backend.local and not settings.WARMUP_CLOUD_INFERENCE:
+                continue
+            start = time.monotonic()
+            try:
+                await run_blocking(
+                    self.analyze_image, image, "Describe this image.", backend.client
+                )
+            except ImageAnalysisError as e:
+                print(f"Warmup failed on {backend.name}: {e}")
+            else:
+                elapsed = time.monotonic() - start
+                print(f"Warmed up {backend.name} in {elapsed:.2f}s")
+
+    def close(self) -> None:
+        """Release the Moondream clients, batch scheduler and on-disk cache handle."""
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self.backends is not None:
+            self.backends.close()
+
+    def single_flight_stats(self) -> dict[str, dict[str, int]]:
+        """Sharing of concurrent image loads and (uncached) inferences."""
+        return {
+            "image_loads": _image_loads.stats(),
+            "media_loads": _media_loads.stats(),
+            "inferences": self._inflight.stats(),
+        }
 
     def get_memory_usage(self) -> dict[str, float]:
         """Get memory usage of the current process in MB."""